@@ -1,4 +1,5 @@
 from binascii import a2b_base64
+import asyncio
 import httpx
 import json
 import os
@@ -7,10 +8,19 @@ import hmac
 import hashlib
 from dotenv import load_dotenv
 from utils.logger import logger
+from http_client import request
+from exchange_info import exchange_info_store
+from klines import COMPACT_COLUMNS, backfill_klines, compact_klines, fetch_klines, interval_ms, now_ms
+import indicators
+from resample import buckets_back, can_resample, plan_bases, resample
+from kline_store import kline_store
+from market_stream import market_stream
+from order_book import OrderBook, fetch_snapshot, order_books
 
 load_dotenv()
 
-URL = "https://api.binance.com/api/v3/"
+# Pages one multi_timeframe fetch may take to serve several timeframes
+MULTI_TIMEFRAME_MAX_PAGES = int(os.environ.get("MULTI_TIMEFRAME_MAX_PAGES", "5"))
 
 
 def serialize_params(params):
@@ -24,29 +34,43 @@ def serialize_params(params):
     return result
 
 
+def _from_stream(reader, symbol=None, symbols=None):
+    """Answer from the live market stream if it has fresh data for every symbol.
+
+    Returns None when the caller should fall back to REST.
+    """
+    if symbol is not None and not symbols:
+        data = reader(symbol)
+        return None if data is None else json.dumps(data)
+    if symbols and symbol is None:
+        data = [reader(s) for s in symbols]
+        return None if any(d is None for d in data) else json.dumps(data)
+    return None
+
+
 async def exchange_info_of_a_symbol(symbol):
     """Get exchange information for a specific symbol."""
-    # This endpoint has NONE security type
-    params = {"symbol": symbol}
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}exchangeInfo",
-            params=params,
-        )
-        return json.dumps(response.json())
+    # Served from the in-memory exchange info store
+    await exchange_info_store.ensure_loaded()
+    info = exchange_info_store.symbol_info(symbol)
+    if info is None:
+        return json.dumps({"code": -1121, "msg": "Invalid symbol."})
+    return json.dumps(info)
 
 
 async def exchange_info_of_all_symbols():
-    """Get exchange information for all symbols."""
-    # This endpoint has NONE security type
-    
+    """Get exchange information for all symbols as the raw JSON text."""
+    # Served from the in-memory exchange info store
+    await exchange_info_store.ensure_loaded()
+    return exchange_info_store.raw
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}exchangeInfo"
-        )
-        return response.json()
+
+async def find_symbols(base_asset=None, quote_asset=None, status=None):
+    """Find symbols by base asset, quote asset and/or trading status."""
+    await exchange_info_store.ensure_loaded()
+    return json.dumps(
+        exchange_info_store.find_symbols(base_asset, quote_asset, status)
+    )
 
 
 async def get_trade_data(symbol, interval, start_time=None, end_time=None, limit=None):
@@ -62,12 +86,107 @@ async def get_trade_data(symbol, interval, start_time=None, end_time=None, limit
     # Remove None values
     params = {k: v for k, v in params.items() if v is not None}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}klines",
-            params=params,
-        )
-        return json.dumps(response.json())
+    # Ranges from a start time go through the local kline store, which only
+    # downloads the candles it does not hold yet
+    if start_time is not None:
+        limit = min(limit or 500, 1000)
+        range_end = start_time + limit * interval_ms(interval) - 1
+        if end_time is not None:
+            range_end = min(range_end, end_time)
+        range_end = min(range_end, now_ms())
+        if range_end < start_time:
+            return "[]"
+        klines = await _klines_between(symbol, interval, start_time, range_end)
+        return json.dumps(klines[:limit])
+
+    response = await request("GET", "klines", params=params)
+    return response.text
+
+
+async def _klines_between(symbol, interval, start_time, end_time):
+    """Every kline in the range, synced through the local kline store so only
+    missing candles are downloaded."""
+    open_klines = await kline_store.sync(symbol, interval, start_time, end_time)
+    if open_klines is None:
+        # Far from the stored candles; fetch just the range
+        return await backfill_klines(symbol, interval, start_time, end_time)
+    meta = kline_store.series(symbol, interval).meta
+    if meta is None:
+        return open_klines
+    klines = kline_store.read(symbol, interval, start_time, min(end_time, meta["covered_end"]))
+    # Candles that have not closed yet are never stored
+    return klines + [k for k in open_klines if meta["covered_end"] < k[0] <= end_time]
+
+
+async def get_trade_data_range(symbol, interval, start_time, end_time=None):
+    """Get every kline between start_time and end_time, however many pages that takes."""
+    # This endpoint has NONE security type
+    end_time = now_ms() if end_time is None else end_time
+    klines = await _klines_between(symbol, interval, start_time, end_time)
+    return json.dumps({
+        "symbol": symbol,
+        "interval": interval,
+        "count": len(klines),
+        "columns": COMPACT_COLUMNS,
+        "rows": compact_klines(klines),
+    })
+
+
+async def multi_timeframe(symbol, timeframes, base_interval=None, limit=100):
+    """Get the latest `limit` klines of several timeframes.
+
+    Timeframes are grouped under a shared Binance interval they are
+    aggregated from (e.g. 1h for 1h and 4h, 1d for 1d, 1w and 1M) as long as
+    its fetch takes at most MULTI_TIMEFRAME_MAX_PAGES pages, using as few
+    fetches as possible. With `base_interval`, every timeframe is
+    aggregated from it.
+    """
+    # This endpoint has NONE security type
+    now = now_ms()
+    timeframe_starts = {timeframe: buckets_back(now, timeframe, limit) for timeframe in timeframes}
+    if base_interval:
+        bases = dict.fromkeys(timeframe_starts, base_interval)
+    else:
+        bases = plan_bases(timeframe_starts, now, MULTI_TIMEFRAME_MAX_PAGES)
+    for timeframe, base in bases.items():
+        if not can_resample(base, timeframe):
+            raise ValueError(f"Cannot derive {timeframe} candles from {base} candles")
+    # One fetch per base interval, long enough for all its timeframes
+    starts = {}
+    for timeframe, base in bases.items():
+        starts[base] = min(starts.get(base, timeframe_starts[timeframe]), timeframe_starts[timeframe])
+    pages = await asyncio.gather(
+        *(_klines_between(symbol, base, start, now) for base, start in starts.items())
+    )
+    klines_by_base = dict(zip(starts, pages))
+    return json.dumps({
+        "symbol": symbol,
+        "baseIntervals": bases,
+        "columns": COMPACT_COLUMNS,
+        "timeframes": {
+            timeframe: compact_klines(resample(klines_by_base[base], base, timeframe)[-limit:])
+            for timeframe, base in bases.items()
+        },
+    })
+
+
+async def technical_indicators(symbols, intervals, limit=500):
+    """Get compact indicator summaries for every (symbol, interval) pair."""
+    # This endpoint has NONE security type
+    keys = [(symbol, interval) for symbol in symbols for interval in intervals]
+    pages = await asyncio.gather(
+        *(fetch_klines(symbol, interval, limit=limit) for symbol, interval in keys),
+        return_exceptions=True,
+    )
+    klines_by_key = {key: page for key, page in zip(keys, pages) if not isinstance(page, Exception)}
+    summaries = indicators.summarize(klines_by_key)
+    result = {symbol: {} for symbol in symbols}
+    for (symbol, interval), page in zip(keys, pages):
+        if isinstance(page, Exception):
+            result[symbol][interval] = {"error": str(page)}
+        else:
+            result[symbol][interval] = summaries[(symbol, interval)]
+    return json.dumps(result)
 
 
 async def agg_trades(symbol):
@@ -75,12 +194,12 @@ async def agg_trades(symbol):
     # This endpoint has NONE security type
     params = {"symbol": symbol, "limit": 20}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}aggTrades",
-            params=params,
-        )
-        return json.dumps(response.json())
+    cached = market_stream.agg_trades(symbol, params["limit"])
+    if cached is not None:
+        return json.dumps(cached)
+
+    response = await request("GET", "aggTrades", params=params)
+    return response.text
 
 
 async def trade_history(symbol):
@@ -88,25 +207,33 @@ async def trade_history(symbol):
     # This endpoint has USER_DATA security type
     params = {"symbol": symbol, "limit": 20}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}historicalTrades",
-            params=params,
-        )
-        return json.dumps(response.json())
+    response = await request("GET", "historicalTrades", params=params)
+    return response.text
 
 
-async def depth(symbol):
+async def depth(symbol, limit=None):
     """Get order book depth for a symbol."""
     # This endpoint has NONE security type
-    params = {"symbol": symbol}
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}depth",
-            params=params,
-        )
-        return json.dumps(response.json())
+    params = {"symbol": symbol, "limit": limit}
+    params = {k: v for k, v in params.items() if v is not None}
+
+    # Watched symbols have a local book kept current from the depth stream
+    book = order_books.book(symbol)
+    if book is not None and (limit or 100) <= order_books.snapshot_limit:
+        return json.dumps(book.snapshot(limit or 100))
+
+    response = await request("GET", "depth", params=params)
+    return response.text
+
+
+async def cumulative_depth(symbol, percent=1.0):
+    """Get bid/ask quantity and notional within `percent` of the mid price."""
+    # This endpoint has NONE security type
+    book = order_books.book(symbol)
+    if book is None:
+        book = OrderBook(symbol.upper())
+        book.load_snapshot(await fetch_snapshot(symbol))
+    return json.dumps(book.cumulative_depth(percent))
 
 
 async def current_avg_price(symbol):
@@ -114,12 +241,8 @@ async def current_avg_price(symbol):
     # This endpoint has NONE security type
     params = {"symbol": symbol}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}avgPrice",
-            params=params,
-        )
-        return json.dumps(response.json())
+    response = await request("GET", "avgPrice", params=params)
+    return response.text
 
 
 async def price_ticker_in_24hr(symbol):
@@ -127,12 +250,12 @@ async def price_ticker_in_24hr(symbol):
     # This endpoint has NONE security type
     params = {"symbol": symbol}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}ticker/24hr",
-            params=params,
-        )
-        return json.dumps(response.json())
+    cached = _from_stream(market_stream.ticker_24hr, symbol)
+    if cached is not None:
+        return cached
+
+    response = await request("GET", "ticker/24hr", params=params)
+    return response.text
 
 
 async def trading_day_ticker(symbols):
@@ -140,12 +263,8 @@ async def trading_day_ticker(symbols):
     # This endpoint has NONE security type
     params = serialize_params({"symbols": symbols})
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}ticker/tradingDay",
-            params=params,
-        )
-        return json.dumps(response.json())
+    response = await request("GET", "ticker/tradingDay", params=params)
+    return response.text
 
 
 async def symbol_price_ticker(symbol=None, symbols=None):
@@ -153,12 +272,12 @@ async def symbol_price_ticker(symbol=None, symbols=None):
     # This endpoint has NONE security type
     params = serialize_params({"symbol": symbol, "symbols": symbols})
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}ticker/price",
-            params=params,
-        )
-        return json.dumps(response.json())
+    cached = _from_stream(market_stream.price_ticker, symbol, symbols)
+    if cached is not None:
+        return cached
+
+    response = await request("GET", "ticker/price", params=params)
+    return response.text
 
 
 async def symbol_order_book_ticker(symbol=None, symbols=None):
@@ -166,12 +285,12 @@ async def symbol_order_book_ticker(symbol=None, symbols=None):
     # This endpoint has NONE security type
     params = serialize_params({"symbol": symbol, "symbols": symbols})
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}ticker/bookTicker",
-            params=params,
-        )
-        return json.dumps(response.json())
+    cached = _from_stream(market_stream.book_ticker, symbol, symbols)
+    if cached is not None:
+        return cached
+
+    response = await request("GET", "ticker/bookTicker", params=params)
+    return response.text
 
 
 async def rolling_window_ticker(
@@ -190,12 +309,8 @@ async def rolling_window_ticker(
         {"symbol": symbol, "symbols": symbols, "windowSize": window_size, "type": type_}
     )
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{URL}ticker",
-            params=params,
-        )
-        return json.dumps(response.json())
+    response = await request("GET", "ticker", params=params)
+    return response.text
 
 
 
@@ -250,14 +365,9 @@ async def get_user_data(omit_zero_balances=False, recv_window=5000):
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{URL}account",
-                params=params,
-                headers=headers
-            )
-            response.raise_for_status()  # Raise exception for 4XX/5XX responses
-            return json.dumps(response.json(), indent=2)
+        response = await request("GET", "account", params=params, headers=headers)
+        response.raise_for_status()  # Raise exception for 4XX/5XX responses
+        return response.text
     except httpx.HTTPStatusError as e:
         return json.dumps({
             "error": f"HTTP error: {e.response.status_code}",
@@ -309,14 +419,14 @@ async def put_order(
     try:
         logger.info(f"Sending order test request with params: {params}")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{URL}order/test",  # Using the test endpoint to avoid actual order
-                params=params,
-                headers=headers
-            )
-            response.raise_for_status()  # Raise exception for 4XX/5XX responses
-            return json.dumps(response.json(), indent=2)
+        response = await request(
+            "POST",
+            "order/test",  # Using the test endpoint to avoid actual order
+            params=params,
+            headers=headers
+        )
+        response.raise_for_status()  # Raise exception for 4XX/5XX responses
+        return response.text
     except httpx.HTTPStatusError as e:
         return json.dumps({
             "error": f"HTTP error: {e.response.status_code}",
@@ -0,0 +1,99 @@
+"""Micro-benchmark: JSON decode/re-encode round trip vs raw text passthrough.
+
+Builds synthetic payloads shaped like the larger Binance responses and times
+what apis.py used to do (`json.dumps(response.json())`) against returning the
+response text as-is. Run with `python bench_passthrough.py`.
+"""
+import json
+import random
+import time
+import tracemalloc
+
+from utils import fastjson
+
+
+def exchange_info_payload(symbols=3000):
+    return {
+        "timezone": "UTC",
+        "serverTime": 1700000000000,
+        "rateLimits": [],
+        "exchangeFilters": [],
+        "symbols": [
+            {
+                "symbol": f"SYM{i}USDT",
+                "status": "TRADING",
+                "baseAsset": f"SYM{i}",
+                "baseAssetPrecision": 8,
+                "quoteAsset": "USDT",
+                "quotePrecision": 8,
+                "orderTypes": ["LIMIT", "LIMIT_MAKER", "MARKET", "STOP_LOSS_LIMIT", "TAKE_PROFIT_LIMIT"],
+                "icebergAllowed": True,
+                "ocoAllowed": True,
+                "isSpotTradingAllowed": True,
+                "isMarginTradingAllowed": False,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": "0.01000000", "maxPrice": "1000000.00000000", "tickSize": "0.01000000"},
+                    {"filterType": "LOT_SIZE", "minQty": "0.00001000", "maxQty": "9000.00000000", "stepSize": "0.00001000"},
+                    {"filterType": "NOTIONAL", "minNotional": "5.00000000", "applyMinToMarket": True},
+                ],
+                "permissions": [],
+                "defaultSelfTradePreventionMode": "EXPIRE_MAKER",
+            }
+            for i in range(symbols)
+        ],
+    }
+
+
+def depth_payload(levels=5000):
+    return {
+        "lastUpdateId": 1027024,
+        "bids": [[f"{60000 - i * 0.01:.8f}", f"{random.random():.8f}"] for i in range(levels)],
+        "asks": [[f"{60000 + i * 0.01:.8f}", f"{random.random():.8f}"] for i in range(levels)],
+    }
+
+
+def klines_payload(count=1000):
+    return [
+        [
+            1700000000000 + i * 60000,
+            "60000.00000000", "60010.00000000", "59990.00000000", "60005.00000000",
+            "12.34567800", 1700000000000 + i * 60000 + 59999, "740740.12345678",
+            1234, "6.17283900", "370370.06172839", "0",
+        ]
+        for i in range(count)
+    ]
+
+
+def measure(fn, text, repeat):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    elapsed = (time.perf_counter() - start) / repeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    payloads = {
+        "exchangeInfo": exchange_info_payload(),
+        "depth?limit=5000": depth_payload(),
+        "klines?limit=1000": klines_payload(),
+    }
+    strategies = {
+        "round trip (json)": lambda text: json.dumps(json.loads(text)),
+        "round trip (fastjson)": lambda text: fastjson.dumps(fastjson.loads(text)),
+        "passthrough": lambda text: text,
+    }
+    print(f"fastjson backend: {'orjson' if fastjson.orjson else 'json'}")
+    for endpoint, payload in payloads.items():
+        text = json.dumps(payload)
+        print(f"\n{endpoint} ({len(text) / 1024:.0f} KiB)")
+        for name, fn in strategies.items():
+            elapsed, peak = measure(fn, text, repeat=5)
+            print(f"  {name:<24} {elapsed * 1000:9.3f} ms  peak {peak / 1024:9.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Micro-benchmark: re-sanitizing the whole history vs the per-message cache.
+
+Replays tool-heavy conversations the way `MCPClient.process_query` grows
+them (an assistant tool_use turn, then a user turn of tool results) and
+times sanitizing the history before every LLM call, once from scratch
+and once with the per-conversation cache. Run with
+`python bench_sanitize.py --results 400`.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from mcp.types import TextContent
+
+from mcp_client import MCPClient
+
+
+def tool_result(i, size):
+    text = json.dumps([[1700000000000 + j * 60000, "60000.0", "60010.0", "59990.0", "60005.0"] for j in range(size)])
+    return {
+        "type": "tool_result",
+        "tool_use_id": f"toolu_{i}",
+        "content": [TextContent(type="text", text=text).model_dump()],
+    }
+
+
+def turns(results, per_turn, size):
+    """Messages appended per LLM call: the first query, then (assistant, tool results) pairs."""
+    yield [{"role": "user", "content": "Analyse BTCUSDT on every timeframe"}]
+    for start in range(0, results, per_turn):
+        ids = range(start, min(start + per_turn, results))
+        yield [
+            {"role": "assistant", "content": [
+                {"type": "tool_use", "id": f"toolu_{i}", "name": "bb7_getTradeData", "input": {"symbol": "BTCUSDT"}}
+                for i in ids
+            ]},
+            {"role": "user", "content": [tool_result(i, size) for i in ids]},
+        ]
+
+
+def replay(client, results, per_turn, size, cached):
+    messages = []
+    cache = [] if cached else None
+    sanitized = None
+    elapsed = 0.0
+    for new in turns(results, per_turn, size):
+        messages.extend(new)
+        started = time.perf_counter()
+        sanitized = client.sanitize_messages(messages, cache)
+        elapsed += time.perf_counter() - started
+    return elapsed, sanitized
+
+
+def measure(client, args, cached):
+    tracemalloc.start()
+    elapsed, sanitized = replay(client, args.results, args.per_turn, args.size, cached)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, sanitized
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=400, help="tool results in the conversation")
+    parser.add_argument("--per-turn", type=int, default=4, help="tool results per LLM turn")
+    parser.add_argument("--size", type=int, default=20, help="klines in each tool result")
+    args = parser.parse_args()
+
+    client = MCPClient()
+    full_time, full_peak, full = measure(client, args, cached=False)
+    cached_time, cached_peak, cached = measure(client, args, cached=True)
+    assert full == cached, "cached sanitization differs from a full pass"
+
+    calls = 1 + -(-args.results // args.per_turn)
+    print(f"{args.results} tool results over {calls} LLM calls, {len(full)} messages at the end")
+    print(f"full re-sanitize   {full_time * 1000:9.1f} ms  peak {full_peak / 1024:8.0f} KiB")
+    print(f"per-message cache  {cached_time * 1000:9.1f} ms  peak {cached_peak / 1024:8.0f} KiB")
+    print(f"speedup            {full_time / cached_time:9.1f}x")
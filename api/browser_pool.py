@@ -0,0 +1,218 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from utils.logger import logger
+
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+# Restart a browser after this many captures to bound memory growth
+BROWSER_RECYCLE_AFTER = int(os.environ.get("BROWSER_RECYCLE_AFTER", "25"))
+BROWSER_HEALTH_CHECK = os.environ.get("BROWSER_HEALTH_CHECK", "true").lower() in ("1", "true", "yes")
+BROWSER_LEASE_TIMEOUT = float(os.environ.get("BROWSER_LEASE_TIMEOUT", "60"))
+# A chart counts as rendered once its price pane canvas is drawn
+CHART_READY_SELECTOR = os.environ.get("CHART_READY_SELECTOR", "table.chart-markup-table canvas")
+CHART_READY_TIMEOUT = float(os.environ.get("CHART_READY_TIMEOUT", "20"))
+# Extra time after the canvas appears for the candles to be painted
+CHART_SETTLE_SECONDS = float(os.environ.get("CHART_SETTLE_SECONDS", "1"))
+
+
+def chrome_options():
+    options = Options()
+    # Run in headless mode (no visible browser window)
+    options.add_argument('--headless=new')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--window-size=1280,800')
+    # Keep background tabs rendering while another tab is being captured
+    options.add_argument('--disable-background-timer-throttling')
+    options.add_argument('--disable-renderer-backgrounding')
+    options.add_argument('--disable-backgrounding-occluded-windows')
+    return options
+
+
+def _chart_rendered(driver):
+    if driver.execute_script("return document.readyState") != "complete":
+        return False
+    canvases = driver.find_elements(By.CSS_SELECTOR, CHART_READY_SELECTOR)
+    return any(canvas.size["width"] > 0 and canvas.size["height"] > 0 for canvas in canvases)
+
+
+def wait_for_chart(driver, timeout=CHART_READY_TIMEOUT):
+    """Wait until the chart in the current tab is rendered; False on timeout."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.25).until(_chart_rendered)
+    except TimeoutException:
+        return False
+    time.sleep(CHART_SETTLE_SECONDS)
+    return True
+
+
+class BrowserPool:
+    """Pool of pre-launched headless Chrome instances leased per capture.
+
+    Browsers are health-checked when leased, replaced when they fail and
+    recycled after `recycle_after` captures. Leasing blocks while all
+    `size` browsers are in use.
+    """
+
+    def __init__(
+        self,
+        size=BROWSER_POOL_SIZE,
+        recycle_after=BROWSER_RECYCLE_AFTER,
+        health_check=BROWSER_HEALTH_CHECK,
+    ):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.health_check = health_check
+        self._idle = queue.Queue()
+        self._uses = {}
+        self._launched = 0
+        self._lock = threading.Lock()
+        self.leases = 0
+        self.restarts = 0
+
+    def _launch(self):
+        driver = webdriver.Chrome(options=chrome_options())
+        self._uses[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver):
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def _healthy(self, driver):
+        try:
+            return driver.execute_script("return 1") == 1 and bool(driver.window_handles)
+        except WebDriverException:
+            return False
+
+    def _reserve(self):
+        """Claim a launch slot; False when all `size` browsers exist."""
+        with self._lock:
+            if self._launched >= self.size:
+                return False
+            self._launched += 1
+            return True
+
+    def _launch_reserved(self):
+        """Launch a browser for a reserved slot, giving the slot back if that fails."""
+        try:
+            return self._launch()
+        except Exception:
+            with self._lock:
+                self._launched -= 1
+            raise
+
+    def start(self):
+        """Launch every browser up front so the first captures are warm."""
+        while self._reserve():
+            self._idle.put(self._launch_reserved())
+        logger.info(f"Browser pool started with {self.size} browsers")
+
+    def _acquire(self):
+        # Chrome takes seconds to start, so launch outside the lock
+        if self._idle.empty() and self._reserve():
+            return self._launch_reserved()
+        return self._idle.get(timeout=BROWSER_LEASE_TIMEOUT)
+
+    def _replace(self):
+        try:
+            self._idle.put(self._launch_reserved())
+        except Exception as e:
+            logger.error(f"Could not launch a replacement browser: {e}")
+
+    @contextmanager
+    def lease(self):
+        driver = self._acquire()
+        if self.health_check and not self._healthy(driver):
+            logger.warning("Browser failed its health check, restarting it")
+            self._discard(driver)
+            self.restarts += 1
+            driver = self._launch_reserved()
+        self.leases += 1
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            uses = self._uses.get(id(driver), 0) + 1
+            if broken or uses >= self.recycle_after:
+                self._discard(driver)
+                self.restarts += 1
+                # Start the replacement now so the next lease is warm
+                self._replace()
+            else:
+                self._uses[id(driver)] = uses
+                self._idle.put(driver)
+
+    def close(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+        self._launched = 0
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "launched": self._launched,
+            "idle": self._idle.qsize(),
+            "leases": self.leases,
+            "restarts": self.restarts,
+        }
+
+
+def capture_in_tabs(driver, targets, on_captured=None):
+    """Load every (url, screenshot_file) target in its own tab, then capture each.
+
+    All tabs start loading at once; each capture waits for its chart to be
+    rendered instead of sleeping a fixed time. `on_captured(index, file)` is
+    called right after each capture. Returns the files captured.
+    """
+    main_tab = driver.current_window_handle
+    tabs = []
+    captured = []
+    try:
+        for url, screenshot_file in targets:
+            driver.switch_to.new_window('tab')
+            tabs.append((driver.current_window_handle, url, screenshot_file))
+            # Navigating from script returns immediately, unlike driver.get
+            driver.execute_script("window.location.href = arguments[0]", url)
+
+        for handle, url, screenshot_file in tabs:
+            driver.switch_to.window(handle)
+            if not wait_for_chart(driver):
+                logger.warning(f"Chart not rendered after {CHART_READY_TIMEOUT}s, capturing anyway: {url}")
+            driver.save_screenshot(screenshot_file)
+            if on_captured:
+                on_captured(len(captured), screenshot_file)
+            captured.append(screenshot_file)
+    finally:
+        # Leave the leased browser with only its main tab, whatever failed
+        for handle, _, _ in tabs:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except WebDriverException as e:
+                logger.warning(f"Could not close capture tab: {e}")
+        try:
+            driver.switch_to.window(main_tab)
+        except WebDriverException as e:
+            logger.warning(f"Could not return to the main tab: {e}")
+    return captured
+
+
+browser_pool = BrowserPool()
@@ -0,0 +1,115 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logger import logger
+
+CAPTURE_WORKERS = int(os.environ.get("CAPTURE_WORKERS", "2"))
+# Jobs allowed to wait for a worker before new submissions are rejected
+CAPTURE_QUEUE_SIZE = int(os.environ.get("CAPTURE_QUEUE_SIZE", "8"))
+CAPTURE_JOB_TIMEOUT = float(os.environ.get("CAPTURE_JOB_TIMEOUT", "120"))
+
+
+class CaptureQueueFull(Exception):
+    pass
+
+
+class CaptureExecutor:
+    """Runs blocking capture-and-upload jobs on worker threads, off the event loop.
+
+    Jobs wait in a bounded queue and `run` fails fast with CaptureQueueFull
+    when it is full. A job cancelled while queued never starts. A job that
+    times out or is cancelled while running gets its result dropped. Its
+    worker stays busy until the thread returns, so at most `workers` jobs run
+    at once.
+    """
+
+    def __init__(self, workers=CAPTURE_WORKERS, queue_size=CAPTURE_QUEUE_SIZE, timeout=CAPTURE_JOB_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._queue = None
+        self._tasks = []
+        self._threads = None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.queue_size)
+        self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix="capture")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._threads:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        while self._queue and not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def run(self, fn, *args, timeout=None):
+        """Queue `fn(*args)` for a worker thread and wait for its result."""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((fn, args, timeout or self.timeout, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise CaptureQueueFull(f"{self.queue_size} capture jobs already waiting, try again later")
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, args, timeout, future = await self._queue.get()
+            if future.cancelled():
+                self.cancelled += 1
+                continue
+            self.running += 1
+            job = loop.run_in_executor(self._threads, fn, *args)
+            try:
+                await asyncio.wait({job, future}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if future.cancelled():
+                    self.cancelled += 1
+                elif not job.done():
+                    self.timeouts += 1
+                    logger.warning(f"Capture job {fn.__name__}{args} timed out after {timeout}s")
+                    future.set_exception(TimeoutError(f"Capture timed out after {timeout}s"))
+                elif job.exception():
+                    self.failed += 1
+                    future.set_exception(job.exception())
+                else:
+                    self.completed += 1
+                    future.set_result(job.result())
+                # Hold the worker until the thread is free again
+                await asyncio.wait({job})
+                if not job.cancelled():
+                    job.exception()  # mark a dropped job's error as retrieved
+            finally:
+                self.running -= 1
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
+
+
+capture_executor = CaptureExecutor()
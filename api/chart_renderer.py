@@ -0,0 +1,87 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+
+import indicators
+
+# Same size as the TradingView captures: 1280x800 at 100 dpi
+FIGSIZE = (12.8, 8.0)
+DPI = 100
+UP_COLOR = "#26a69a"
+DOWN_COLOR = "#ef5350"
+BACKGROUND = "#131722"
+GRID = "#2a2e39"
+TEXT = "#d1d4dc"
+
+
+def _boxes(x, bottom, top, width=0.7):
+    """Rectangle vertices, shaped (n, 4, 2), for candle bodies or volume bars."""
+    left, right = x - width / 2, x + width / 2
+    return np.stack([
+        np.column_stack([left, bottom]),
+        np.column_stack([left, top]),
+        np.column_stack([right, top]),
+        np.column_stack([right, bottom]),
+    ], axis=1)
+
+
+def render_chart(klines, path, title, overlays=True):
+    """Draw a candlestick chart with volume from Binance klines and save it as PNG.
+
+    Uses the Figure API on the Agg backend directly (no pyplot state), so
+    charts can be rendered concurrently in worker processes or threads.
+    With `overlays`, EMA 20/50 and Bollinger bands are drawn on the price.
+    """
+    data = np.array([k[1:6] for k in klines], dtype=float)
+    open_, high, low, close, volume = data.T
+    x = np.arange(len(data))
+    up = close >= open_
+    colors = np.where(up, UP_COLOR, DOWN_COLOR)
+
+    fig = Figure(figsize=FIGSIZE, dpi=DPI, facecolor=BACKGROUND)
+    grid = fig.add_gridspec(4, 1, hspace=0.05, left=0.02, right=0.93, top=0.95, bottom=0.05)
+    price_ax = fig.add_subplot(grid[:3, 0])
+    volume_ax = fig.add_subplot(grid[3, 0], sharex=price_ax)
+
+    for ax in (price_ax, volume_ax):
+        ax.set_facecolor(BACKGROUND)
+        ax.grid(color=GRID, linewidth=0.5)
+        ax.tick_params(colors=TEXT, labelsize=8)
+        ax.yaxis.tick_right()
+        for spine in ax.spines.values():
+            spine.set_color(GRID)
+
+    # One collection per layer instead of one artist per candle keeps drawing fast
+    price_ax.vlines(x, low, high, colors=colors, linewidth=0.8)
+    price_ax.add_collection(PolyCollection(
+        _boxes(x, np.minimum(open_, close), np.maximum(open_, close)), facecolors=colors, edgecolors=colors
+    ))
+    volume_ax.add_collection(PolyCollection(
+        _boxes(x, np.zeros_like(volume), volume), facecolors=colors, alpha=0.6, linewidths=0
+    ))
+    price_ax.set_ylim(low.min() - (high.max() - low.min()) * 0.05, high.max() + (high.max() - low.min()) * 0.05)
+    volume_ax.set_ylim(0, volume.max() * 1.1 if volume.max() > 0 else 1)
+
+    if overlays and len(data) >= 2:
+        price_ax.plot(x, indicators.ema(close, 20), color="#2962ff", linewidth=1, label="EMA 20")
+        price_ax.plot(x, indicators.ema(close, 50), color="#ff9800", linewidth=1, label="EMA 50")
+        upper, _, lower = indicators.bollinger(close)
+        price_ax.fill_between(x, lower, upper, color="#7e57c2", alpha=0.12, label="BB 20, 2")
+        price_ax.legend(loc="upper left", fontsize=8, facecolor=BACKGROUND, labelcolor=TEXT, edgecolor=GRID)
+
+    price_ax.set_title(title, color=TEXT, loc="left", fontsize=11)
+    price_ax.set_xlim(-1, len(data))
+    price_ax.tick_params(labelbottom=False)
+    # Label the x axis with dates instead of candle indexes
+    ticks = np.linspace(0, len(data) - 1, num=min(len(data), 8), dtype=int)
+    volume_ax.set_xticks(ticks)
+    volume_ax.set_xticklabels(
+        [np.datetime64(int(klines[i][0]), "ms").astype("datetime64[m]").astype(str).replace("T", " ")
+         for i in ticks]
+    )
+    fig.savefig(path, facecolor=BACKGROUND)
+    return path
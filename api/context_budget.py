@@ -0,0 +1,133 @@
+import json
+import os
+
+# Approximate tokens of history sent to the LLM before old tool results are compacted
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "50000"))
+# Longest text a compacted tool result keeps
+CONTEXT_COMPACT_CHARS = int(os.environ.get("CONTEXT_COMPACT_CHARS", "2000"))
+# Rough average for English text and JSON; only used for budgeting
+CHARS_PER_TOKEN = 4
+# List items kept from each end of a JSON array when projecting it
+PROJECTION_ITEMS = 3
+
+
+def _chars(value):
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + _chars(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_chars(item) for item in value)
+    text = getattr(value, "text", None)
+    if isinstance(text, str):
+        return len(text)
+    return len(str(value))
+
+
+def estimate_tokens(value):
+    return _chars(value) // CHARS_PER_TOKEN + 1
+
+
+def _project(value, depth=0):
+    """Shrink parsed JSON: long arrays keep their ends, deep objects keep only scalars."""
+    if isinstance(value, list):
+        if len(value) > 2 * PROJECTION_ITEMS:
+            return {
+                "_length": len(value),
+                "_head": [_project(item, depth + 1) for item in value[:PROJECTION_ITEMS]],
+                "_tail": [_project(item, depth + 1) for item in value[-PROJECTION_ITEMS:]],
+            }
+        return [_project(item, depth + 1) for item in value]
+    if isinstance(value, dict):
+        if depth >= 2:
+            return {key: item for key, item in value.items() if not isinstance(item, (list, dict))}
+        return {key: _project(item, depth + 1) for key, item in value.items()}
+    return value
+
+
+def compact_text(text, max_chars=CONTEXT_COMPACT_CHARS):
+    """Short stand-in for a large tool result text."""
+    if len(text) <= max_chars:
+        return text
+    try:
+        projected = json.dumps(_project(json.loads(text)), separators=(",", ":"))
+        prefix = f"[compacted from {len(text)} chars: long arrays show their first and last items] "
+        if len(projected) <= max_chars:
+            return prefix + projected
+        text = projected
+    except (ValueError, TypeError):
+        prefix = ""
+    return prefix + text[:max_chars] + f"... [{len(text) - max_chars} more chars truncated]"
+
+
+def _result_text(content):
+    if isinstance(content, str):
+        return content
+    return "\n".join(
+        item.get("text", "") if isinstance(item, dict) else getattr(item, "text", "") or "" for item in content or []
+    )
+
+
+class ContextState:
+    """Per-conversation token estimates and compacted tool results, reused across LLM calls."""
+
+    def __init__(self):
+        self.counts = []
+        self.compacted = {}
+        self.tokens_saved = 0
+        self.calls = 0
+
+
+class ContextBudget:
+    """Keeps the history sent to the LLM under an approximate token budget.
+
+    When the estimate exceeds the budget, tool results are compacted oldest
+    first: JSON is projected (long arrays keep their first and last items,
+    deep nesting is cut) and other text truncated. If that is not enough
+    they are replaced by a one-line stub. The latest message, holding the
+    tool results the model is about to read, is never touched.
+    """
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, compact_chars=CONTEXT_COMPACT_CHARS):
+        self.budget = budget
+        self.compact_chars = compact_chars
+
+    def fit(self, messages, state):
+        """Return (messages to send, report); `messages` itself is not modified."""
+        for message in messages[len(state.counts):]:
+            state.counts.append(estimate_tokens(message["content"]))
+        counts = state.counts[:len(messages)]
+        before = total = sum(counts)
+        compacted = 0
+        fitted = list(messages)
+
+        for stub in (False, True):
+            for i, message in enumerate(fitted[:-1]):
+                if total <= self.budget:
+                    break
+                if message["role"] != "user" or not isinstance(message["content"], list):
+                    continue
+                content = [self._compact(item, state, stub) for item in message["content"]]
+                tokens = estimate_tokens(content)
+                if tokens < counts[i]:
+                    fitted[i] = {**message, "content": content}
+                    total -= counts[i] - tokens
+                    counts[i] = tokens
+                    compacted += 1
+
+        state.calls += 1
+        state.tokens_saved += before - total
+        return fitted, {"tokens_before": before, "tokens_after": total, "compacted_messages": compacted}
+
+    def _compact(self, item, state, stub):
+        if not isinstance(item, dict) or item.get("type") != "tool_result":
+            return item
+        key = item.get("tool_use_id")
+        text = _result_text(item.get("content"))
+        if stub:
+            replacement = f"[tool result of ~{estimate_tokens(text)} tokens omitted to fit the context budget]"
+        else:
+            if key not in state.compacted:
+                state.compacted[key] = compact_text(text, self.compact_chars)
+            replacement = state.compacted[key]
+        return {**item, "content": [{"type": "text", "text": replacement}]}
@@ -0,0 +1,231 @@
+"""Append-only JSON Lines journal of conversations.
+
+Every message is written once, as one compact line
+`{"c": conversation id, "i": message index, "t": unix time, "m": message}`
+appended to `journal.jsonl`. The active file is rotated into a closed
+`journal-<timestamp>.jsonl` segment once it grows past
+JOURNAL_SEGMENT_BYTES. Closed segments are periodically compacted into one
+segment, which drops duplicate lines and conversations outside the
+retention window. Compaction keeps or drops whole conversations, and
+always keeps the ones still written to the active file. A conversation is
+rebuilt by reading its lines from all segments in order.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+from utils.logger import logger
+
+JOURNAL_DIR = os.environ.get("CONVERSATION_JOURNAL_DIR", "conversations")
+JOURNAL_FILE = "journal.jsonl"
+JOURNAL_SEGMENT_BYTES = int(os.environ.get("JOURNAL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+# Buffered lines are written at least this often (seconds)
+JOURNAL_FLUSH_INTERVAL = float(os.environ.get("JOURNAL_FLUSH_INTERVAL", "0.5"))
+JOURNAL_COMPACT_INTERVAL = float(os.environ.get("JOURNAL_COMPACT_INTERVAL", "600"))
+JOURNAL_RETENTION_DAYS = float(os.environ.get("JOURNAL_RETENTION_DAYS", "30"))
+# Conversations kept by compaction besides the live ones in the active file
+JOURNAL_MAX_CONVERSATIONS = int(os.environ.get("JOURNAL_MAX_CONVERSATIONS", "500"))
+
+
+def serializable_message(message):
+    """Message as plain JSON types (SDK content blocks become dicts)."""
+    content = message["content"]
+    if isinstance(content, list):
+        items = []
+        for item in content:
+            if hasattr(item, "to_dict"):
+                item = item.to_dict()
+            elif hasattr(item, "model_dump"):
+                item = item.model_dump()
+            elif isinstance(item, dict) and isinstance(item.get("content"), list):
+                # Tool results carry MCP content objects
+                item = {**item, "content": [
+                    c.model_dump() if hasattr(c, "model_dump") else c for c in item["content"]
+                ]}
+            items.append(item)
+        content = items
+    elif not isinstance(content, str):
+        content = str(content)
+    return {"role": message["role"], "content": content}
+
+
+def read_segment(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash can leave a partial last line
+                logger.warning(f"Skipping corrupt journal line in {path}")
+    return records
+
+
+class ConversationJournal:
+    def __init__(self, directory=JOURNAL_DIR):
+        self.directory = directory
+        self._counts = {}
+        self._pending = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = None
+        self._tasks = []
+        self.lines_written = 0
+        self.flushes = 0
+        self.compactions = 0
+
+    @property
+    def active_path(self):
+        return os.path.join(self.directory, JOURNAL_FILE)
+
+    def segments(self):
+        """Closed segments oldest first, then the active file."""
+        if not os.path.isdir(self.directory):
+            return []
+        closed = sorted(
+            f for f in os.listdir(self.directory) if f.startswith("journal-") and f.endswith(".jsonl")
+        )
+        paths = [os.path.join(self.directory, f) for f in closed]
+        if os.path.exists(self.active_path):
+            paths.append(self.active_path)
+        return paths
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(self._load_counts)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._writer()), asyncio.create_task(self._compactor())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    def _load_counts(self):
+        for path in self.segments():
+            for record in read_segment(path):
+                self._counts[record["c"]] = max(self._counts.get(record["c"], 0), record["i"] + 1)
+
+    def record(self, conversation_id, messages):
+        """Queue the messages not journaled yet; never blocks on disk."""
+        start = self._counts.get(conversation_id, 0)
+        now = round(time.time(), 3)
+        for index in range(start, len(messages)):
+            self._pending.append(json.dumps(
+                {"c": conversation_id, "i": index, "t": now, "m": serializable_message(messages[index])},
+                separators=(",", ":"), default=str,
+            ))
+        self._counts[conversation_id] = max(start, len(messages))
+        if self._wakeup and len(self._pending) >= 100:
+            self._wakeup.set()
+
+    async def _writer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOURNAL_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except OSError as e:
+                logger.error(f"Error writing conversation journal: {e}")
+
+    async def flush(self):
+        # Also waits for a flush in progress, so every recorded line is on disk after it
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            lines, self._pending = self._pending, []
+            await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.active_path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+        self.lines_written += len(lines)
+        self.flushes += 1
+        if os.path.getsize(self.active_path) > JOURNAL_SEGMENT_BYTES:
+            os.replace(self.active_path, self._segment_path())
+
+    def _segment_path(self):
+        return os.path.join(self.directory, f"journal-{datetime.now().strftime('%Y%m%d%H%M%S%f')}.jsonl")
+
+    async def _compactor(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.compact)
+            except OSError as e:
+                logger.error(f"Error compacting conversation journal: {e}")
+            await asyncio.sleep(JOURNAL_COMPACT_INTERVAL)
+
+    def compact(self):
+        """Merge closed segments into one, applying retention. Skips the active file."""
+        closed = [path for path in self.segments() if path != self.active_path]
+        if not closed:
+            return
+        # Conversations still being written are live, however old their first lines
+        live = set()
+        if os.path.exists(self.active_path):
+            live = {record["c"] for record in read_segment(self.active_path)}
+        latest = {}
+        last_active = {}
+        total_lines = 0
+        for path in closed:
+            records = read_segment(path)
+            total_lines += len(records)
+            for record in records:
+                latest[(record["c"], record["i"])] = record
+                last_active[record["c"]] = max(last_active.get(record["c"], 0), record["t"])
+
+        cutoff = time.time() - JOURNAL_RETENTION_DAYS * 86400
+        recent = sorted(
+            (c for c, t in last_active.items() if t >= cutoff and c not in live), key=last_active.get, reverse=True
+        )
+        # Whole conversations are kept or dropped, never some of their lines
+        keep = live | set(recent[:JOURNAL_MAX_CONVERSATIONS])
+        records = sorted(
+            (record for key, record in latest.items() if key[0] in keep), key=lambda r: (r["t"], r["c"], r["i"])
+        )
+        if len(closed) == 1 and len(records) == total_lines:
+            return
+
+        target = closed[-1]
+        tmp = target + ".tmp"
+        with open(tmp, "w") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        os.replace(tmp, target)
+        for path in closed[:-1]:
+            os.remove(path)
+        self.compactions += 1
+        logger.info(f"Compacted {len(closed)} journal segments into {len(records)} lines")
+
+    def known(self, conversation_id):
+        return conversation_id in self._counts
+
+    async def load(self, conversation_id):
+        """Messages of one conversation, rebuilt from the journal."""
+        await self.flush()
+        return await asyncio.to_thread(self._load, conversation_id)
+
+    def _load(self, conversation_id):
+        messages = {}
+        for path in self.segments():
+            for record in read_segment(path):
+                if record["c"] == conversation_id:
+                    messages[record["i"]] = record["m"]
+        return [messages[i] for i in sorted(messages)]
+
+    def stats(self):
+        return {
+            "conversations": len(self._counts),
+            "pending_lines": len(self._pending),
+            "lines_written": self.lines_written,
+            "flushes": self.flushes,
+            "compactions": self.compactions,
+            "segments": len(self.segments()),
+        }
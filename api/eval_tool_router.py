@@ -0,0 +1,199 @@
+"""Offline evaluation of the tool router: token savings against task success.
+
+Replays recorded conversations from the conversation journal. For every
+user query, the tools the model actually called before the next query are
+taken as the tools the task needed. The query counts as a success when the
+router selected all of them up front, and as recovered when the missing
+ones come back through `requestMoreTools` (one extra LLM turn). Token
+counts are estimated from the JSON of the tool definitions sent.
+
+Raw token savings ignore prompt caching. Tools and the system prompt form
+the first cached block, so the cache-adjusted cost replays the queries in
+order (all within the cache lifetime) and charges that prefix at the
+cache write price the first time each tool subset is sent, and at the
+read price after that. A recovered miss adds one call with the widened
+subset.
+
+    python eval_tool_router.py --journal conversations
+    python eval_tool_router.py --sample      # built-in queries, no journal needed
+
+The built-in queries come in two sets. SAMPLE_CASES use the words of
+tool_router.TOOL_KEYWORDS, which were written alongside them, so their
+numbers are optimistic. HELD_OUT_CASES paraphrase similar tasks without
+that vocabulary and show how the router does on wording it was not tuned on.
+
+Tool definitions are read from the MCP server (`mcp_server.py`) unless
+--tools names a JSON file of {"name", "description", "input_schema"}.
+"""
+import argparse
+import asyncio
+import json
+
+from context_budget import estimate_tokens
+from conversation_journal import ConversationJournal, read_segment
+from mcp_client import system_prompt
+from tool_router import TOOL_KEYWORDS, ToolRouter, tokenize
+
+# Prompt cache prices relative to uncached input tokens
+CACHE_WRITE_PRICE = 1.25
+CACHE_READ_PRICE = 0.1
+
+# (query, tools a good answer calls) for a quick check without recorded
+# conversations; written together with TOOL_KEYWORDS
+SAMPLE_CASES = [
+    ("Analyse BTCUSDT and give me entry, target and stop loss", {"bb7_MultiTimeframe", "takeScreenShotOfTarde"}),
+    ("What is the price of ETH right now?", {"bb7_SymbolPriceTicker"}),
+    ("Show me RSI and MACD for SOLUSDT on 1h and 4h", {"bb7_TechnicalIndicators"}),
+    ("How did XRP perform over the last 24h, volume and change?", {"bb7_PriceTickerIn24Hr"}),
+    ("Is there a big sell wall in the BTCUSDT order book?", {"bb7_Depth", "bb7_CumulativeDepth"}),
+    ("Buy 0.01 BTC at market", {"bb7_PutOrder"}),
+    ("Which USDT pairs are listed for PEPE?", {"bb7_FindSymbols"}),
+    ("What is the minimum order size and tick size for DOGEUSDT?", {"bb7_ExchangeInfoOfASymbole"}),
+    ("Take a screenshot of the ETH chart", {"takeScreenShotOfTarde"}),
+    ("Get daily BTC klines since January for a backtest", {"bb7_getTradeDataRange"}),
+    ("Are whales buying? Show recent trades for BNBUSDT", {"bb7_AggTrades", "bb7_TradeHistory"}),
+    ("What's the spread between best bid and ask on ADAUSDT?", {"bb7_SymbolOrderBookTicker"}),
+    ("Weekly and monthly trend for LINKUSDT", {"bb7_MultiTimeframe"}),
+    ("List every symbol on the exchange", {"bb7_ExchangeInfoOfAllSymbole"}),
+]
+# Paraphrases that share no word with TOOL_KEYWORDS (checked when evaluated)
+HELD_OUT_CASES = [
+    ("Should I go in on SOL now? Give me a plan with where to get in, where to take profit and where to bail",
+     {"bb7_MultiTimeframe", "takeScreenShotOfTarde"}),
+    ("How much is one ether worth in dollars?", {"bb7_SymbolPriceTicker"}),
+    ("Is bitcoin overbought or oversold at the moment?", {"bb7_TechnicalIndicators"}),
+    ("How did dogecoin do from yesterday until now?", {"bb7_PriceTickerIn24Hr"}),
+    ("How much money sits waiting just under and just above the current ETH value?", {"bb7_CumulativeDepth"}),
+    ("Go ahead and purchase 50 dollars of BNB for me", {"bb7_PutOrder"}),
+    ("Which coins can I swap against the euro here?", {"bb7_FindSymbols"}),
+    ("How many decimals does XRP accept when I submit a quantity?", {"bb7_ExchangeInfoOfASymbole"}),
+    ("Grab a photo of the Cardano graph for me", {"takeScreenShotOfTarde"}),
+    ("Pull ETH candles from the start of 2021 up to now so I can test a strategy", {"bb7_getTradeDataRange"}),
+    ("Are big players piling into LINK in the last few minutes?", {"bb7_AggTrades"}),
+    ("How wide is the gap between the top buyer and top seller on ADA?", {"bb7_SymbolOrderBookTicker"}),
+    ("Zoom out on AVAX: how does it look on the larger horizons?", {"bb7_MultiTimeframe"}),
+    ("Dump the complete catalogue of coins this venue offers", {"bb7_ExchangeInfoOfAllSymbole"}),
+    ("How has MATIC moved over the past seven sessions?", {"bb7_RollingWindowTicker"}),
+    ("What is BTC's mean value over the last five minutes?", {"bb7_CurrentAvgPrice"}),
+]
+
+
+async def server_tools():
+    from mcp_server import mcp
+
+    return [
+        {"name": tool.name, "description": tool.description, "input_schema": tool.inputSchema}
+        for tool in await mcp.list_tools()
+    ]
+
+
+def journal_cases(directory):
+    """(query, tools called while answering it, prior messages) from journaled conversations."""
+    conversations = {}
+    for path in ConversationJournal(directory).segments():
+        for record in read_segment(path):
+            conversations.setdefault(record["c"], {})[record["i"]] = record["m"]
+
+    cases = []
+    for messages in conversations.values():
+        messages = [messages[i] for i in sorted(messages)]
+        for i, message in enumerate(messages):
+            if message["role"] != "user" or not isinstance(message["content"], str):
+                continue
+            used = set()
+            for reply in messages[i + 1:]:
+                if reply["role"] == "user" and isinstance(reply["content"], str):
+                    break
+                if reply["role"] == "assistant" and isinstance(reply["content"], list):
+                    used.update(block["name"] for block in reply["content"] if block.get("type") == "tool_use")
+            cases.append((message["content"], used, messages[:i]))
+    return cases
+
+
+class PrefixCache:
+    """Cost of the tools + system prompt prefix over calls that share one prompt cache."""
+
+    def __init__(self):
+        self.cached = set()
+        self.cost = 0.0
+
+    def send(self, tools):
+        key = tuple(tool["name"] for tool in tools)
+        tokens = estimate_tokens(json.dumps(tools)) + estimate_tokens(system_prompt)
+        self.cost += tokens * (CACHE_READ_PRICE if key in self.cached else CACHE_WRITE_PRICE)
+        self.cached.add(key)
+
+
+def evaluate(tools, cases):
+    router = ToolRouter(tools)
+    descriptions = {tool["name"]: (tool.get("description") or "").strip().splitlines()[0] for tool in tools}
+    full_tokens = estimate_tokens(json.dumps(tools))
+    routed_tokens = successes = recovered = needed_total = selected_needed = fallbacks = 0
+    full_prefix, routed_prefix = PrefixCache(), PrefixCache()
+
+    for query, used, history in cases:
+        used = {name for name in used if name in descriptions}
+        selected = router.select(query, history)
+        fallbacks += len(selected) == len(tools)
+        routed_tokens += estimate_tokens(json.dumps(router.tools_for(selected)))
+        full_prefix.send(tools)
+        routed_prefix.send(router.tools_for(selected))
+        needed_total += len(used)
+        selected_needed += len(used & selected)
+        missing = used - selected
+        if not missing:
+            successes += 1
+            continue
+        # The model asks for what it lacks, in the words of the tool's description
+        for name in missing:
+            router.expand(selected, descriptions[name])
+        routed_prefix.send(router.tools_for(selected))
+        if used <= selected:
+            recovered += 1
+        print(f"miss {sorted(missing)} for: {query[:70]}")
+
+    count = len(cases) or 1
+    return {
+        "queries": len(cases),
+        "tools_total": len(tools),
+        "tool_tokens_full": full_tokens,
+        "tool_tokens_routed_avg": round(routed_tokens / count),
+        "token_savings_pct": round(100 * (1 - routed_tokens / (full_tokens * count)), 1),
+        "prefix_cost_full": round(full_prefix.cost),
+        "prefix_cost_routed": round(routed_prefix.cost),
+        "cached_savings_pct": round(100 * (1 - routed_prefix.cost / full_prefix.cost), 1) if cases else 0.0,
+        "fallback_rate": round(fallbacks / count, 3),
+        "recall": round(selected_needed / needed_total, 3) if needed_total else 1.0,
+        "success_rate": round(successes / count, 3),
+        "recovered_rate": round((successes + recovered) / count, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--journal", default="conversations", help="conversation journal directory")
+    parser.add_argument("--sample", action="store_true", help="use the built-in sample queries")
+    parser.add_argument("--tools", help="JSON file with tool definitions instead of the MCP server's")
+    args = parser.parse_args()
+
+    if args.tools:
+        with open(args.tools) as f:
+            tools = json.load(f)
+    else:
+        tools = asyncio.run(server_tools())
+    if args.sample:
+        keywords = set().union(*(tokenize(words) for words in TOOL_KEYWORDS.values()))
+        for query, _ in HELD_OUT_CASES:
+            shared = tokenize(query) & keywords
+            if shared:
+                print(f"warning: held-out query shares {sorted(shared)} with TOOL_KEYWORDS: {query}")
+        sets = {"tuned sample": SAMPLE_CASES, "held-out": HELD_OUT_CASES}
+        sets = {name: [(query, used, []) for query, used in cases] for name, cases in sets.items()}
+    else:
+        sets = {args.journal: journal_cases(args.journal)}
+        if not sets[args.journal]:
+            parser.exit(1, f"No recorded queries in {args.journal}; record some or pass --sample\n")
+    for name, cases in sets.items():
+        print(f"== {name}")
+        for key, value in evaluate(tools, cases).items():
+            print(f"{key:24} {value}")
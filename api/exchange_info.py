@@ -0,0 +1,126 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+from utils.logger import logger
+from utils.fastjson import loads
+from http_client import request
+
+# How long a downloaded exchangeInfo payload is served before it is refreshed
+EXCHANGE_INFO_TTL = float(os.environ.get("EXCHANGE_INFO_TTL", "3600"))
+
+
+class ExchangeInfoStore:
+    """In-memory copy of /exchangeInfo indexed by symbol, asset and status.
+
+    The full payload is downloaded once and refreshed in the background every
+    `ttl` seconds, so per-symbol lookups never touch the network.
+    """
+
+    def __init__(self, ttl=EXCHANGE_INFO_TTL):
+        self.ttl = ttl
+        self.payload = None
+        self.raw = None
+        self.loaded_at = 0.0
+        self.by_symbol = {}
+        self.by_base_asset = defaultdict(set)
+        self.by_quote_asset = defaultdict(set)
+        self.by_status = defaultdict(set)
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    @property
+    def is_stale(self):
+        return self.payload is None or time.monotonic() - self.loaded_at > self.ttl
+
+    async def load(self):
+        """Download the full payload and rebuild every index."""
+        response = await request("GET", "exchangeInfo")
+        response.raise_for_status()
+        self._index(loads(response.content), response.text)
+        logger.info(f"Loaded exchange info for {len(self.by_symbol)} symbols")
+
+    def _index(self, payload, raw):
+        by_symbol = {}
+        by_base_asset = defaultdict(set)
+        by_quote_asset = defaultdict(set)
+        by_status = defaultdict(set)
+        for info in payload.get("symbols", []):
+            symbol = info["symbol"]
+            by_symbol[symbol] = info
+            by_base_asset[info.get("baseAsset")].add(symbol)
+            by_quote_asset[info.get("quoteAsset")].add(symbol)
+            by_status[info.get("status")].add(symbol)
+
+        # Swap the indexes in one go so readers never see a half-built store
+        self.payload = payload
+        self.raw = raw
+        self.by_symbol = by_symbol
+        self.by_base_asset = by_base_asset
+        self.by_quote_asset = by_quote_asset
+        self.by_status = by_status
+        self.loaded_at = time.monotonic()
+
+    async def ensure_loaded(self):
+        """Load the payload if it has never been loaded or has expired."""
+        if not self.is_stale:
+            return
+        async with self._lock:
+            if self.is_stale:
+                await self.load()
+
+    def symbol_info(self, symbol):
+        """Return the payload for one symbol in the shape of /exchangeInfo?symbol=..."""
+        info = self.by_symbol.get(symbol.upper())
+        if info is None:
+            return None
+        return {
+            key: value for key, value in self.payload.items() if key != "symbols"
+        } | {"symbols": [info]}
+
+    def find_symbols(self, base_asset=None, quote_asset=None, status=None):
+        """Return the sorted symbols matching every filter that is given."""
+        matches = None
+        for index, value in (
+            (self.by_base_asset, base_asset),
+            (self.by_quote_asset, quote_asset),
+            (self.by_status, status),
+        ):
+            if value is None:
+                continue
+            found = index.get(value.upper(), set())
+            matches = found if matches is None else matches & found
+        if matches is None:
+            matches = self.by_symbol.keys()
+        return sorted(matches)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Exchange info refresh failed: {e}")
+
+    async def start(self):
+        """Load the payload and start refreshing it in the background."""
+        try:
+            await self.load()
+        except Exception as e:
+            # Lookups retry the download lazily through ensure_loaded
+            logger.error(f"Initial exchange info load failed: {e}")
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+exchange_info_store = ExchangeInfoStore()
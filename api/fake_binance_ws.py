@@ -0,0 +1,115 @@
+"""Local stand-in for the Binance combined-stream WebSocket endpoint.
+
+Serves synthetic @ticker, @bookTicker and @aggTrade events for whatever
+streams the client asks for in `/stream?streams=...` (and later SUBSCRIBE
+requests), so the market stream can be exercised offline:
+
+    python fake_binance_ws.py --port 8765 --drop-after 50
+    BINANCE_WS_URL=ws://localhost:8765 MARKET_STREAM_SYMBOLS=BTCUSDT,ETHUSDT python main.py
+
+`--drop-after N` closes each connection after N messages to exercise
+reconnects.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import parse_qs, urlparse
+
+import websockets
+
+
+class FakeMarket:
+    """Random-walk prices and monotonically increasing ids per symbol."""
+
+    def __init__(self):
+        self.prices = {}
+        self.trade_id = 0
+        self.update_id = 0
+
+    def _step(self, symbol):
+        price = self.prices.get(symbol, 100.0) * (1 + random.uniform(-0.001, 0.001))
+        self.prices[symbol] = price
+        return price
+
+    def event(self, stream):
+        symbol = stream.split("@", 1)[0].upper()
+        kind = stream.split("@", 1)[1]
+        price = self._step(symbol)
+        now = int(time.time() * 1000)
+        self.update_id += 1
+        if kind == "ticker":
+            data = {
+                "e": "24hrTicker", "E": now, "s": symbol,
+                "p": "1.00000000", "P": "1.000", "w": f"{price:.8f}",
+                "x": f"{price * 0.99:.8f}", "c": f"{price:.8f}", "Q": "0.10000000",
+                "b": f"{price * 0.9999:.8f}", "B": "1.00000000",
+                "a": f"{price * 1.0001:.8f}", "A": "1.00000000",
+                "o": f"{price * 0.99:.8f}", "h": f"{price * 1.01:.8f}", "l": f"{price * 0.98:.8f}",
+                "v": "1000.00000000", "q": f"{price * 1000:.8f}",
+                "O": now - 86400000, "C": now, "F": 0, "L": self.trade_id, "n": self.trade_id + 1,
+            }
+        elif kind == "bookTicker":
+            data = {
+                "u": self.update_id, "s": symbol,
+                "b": f"{price * 0.9999:.8f}", "B": "1.00000000",
+                "a": f"{price * 1.0001:.8f}", "A": "1.00000000",
+            }
+        elif kind == "aggTrade":
+            self.trade_id += 1
+            data = {
+                "e": "aggTrade", "E": now, "s": symbol, "a": self.trade_id,
+                "p": f"{price:.8f}", "q": f"{random.uniform(0.01, 1):.8f}",
+                "f": self.trade_id, "l": self.trade_id, "T": now,
+                "m": random.random() < 0.5, "M": True,
+            }
+        else:
+            return None
+        return {"stream": stream, "data": data}
+
+
+async def serve(host, port, interval, drop_after):
+    market = FakeMarket()
+
+    async def handler(websocket):
+        path = websocket.request.path
+        streams = set(parse_qs(urlparse(path).query).get("streams", [""])[0].split("/")) - {""}
+        sent = 0
+
+        async def read_requests():
+            async for raw in websocket:
+                request = json.loads(raw)
+                if request.get("method") == "SUBSCRIBE":
+                    streams.update(request["params"])
+                elif request.get("method") == "UNSUBSCRIBE":
+                    streams.difference_update(request["params"])
+                await websocket.send(json.dumps({"result": None, "id": request.get("id")}))
+
+        reader = asyncio.create_task(read_requests())
+        try:
+            while drop_after is None or sent < drop_after:
+                for stream in sorted(streams):
+                    event = market.event(stream)
+                    if event is not None:
+                        await websocket.send(json.dumps(event))
+                        sent += 1
+                await asyncio.sleep(interval)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            reader.cancel()
+
+    async with websockets.serve(handler, host, port):
+        print(f"Fake Binance stream listening on ws://{host}:{port}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between event batches")
+    parser.add_argument("--drop-after", type=int, default=None, help="close connections after N messages")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.interval, args.drop_after))
@@ -0,0 +1,208 @@
+"""Local stand-in for the Anthropic Messages API, with SSE streaming.
+
+Answers POST /v1/messages without a network connection or API key. Any
+tool whose name appears in the latest user query is called in the reply,
+with arguments filled in from its input schema. A turn that carries tool
+results gets a short text answer. Responses stream with delays between
+blocks so that early tool execution can be observed.
+
+Prompt caching is simulated: requests with more than 4 cache_control
+breakpoints are rejected like the real API, and the prefix up to each
+breakpoint (tools, then system, then messages) is remembered, so usage
+reports cache_read_input_tokens and cache_creation_input_tokens:
+
+    python fake_llm_server.py --port 8100 --block-delay 0.5
+    ANTHROPIC_BASE_URL=http://localhost:8100 ANTHROPIC_API_KEY=fake python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHART_URL = "https://www.tradingview.com/chart/YiBYLtYW/?symbol=CRYPTO%3ABTCUSD"
+MAX_BREAKPOINTS = 4
+
+
+def _sample(name, schema):
+    kind = schema.get("type")
+    if kind in ("integer", "number"):
+        return 10
+    if kind == "boolean":
+        return False
+    if kind == "array":
+        return ["BTCUSDT"]
+    if "url" in name.lower():
+        return CHART_URL
+    if "interval" in name.lower():
+        return "1h"
+    return "BTCUSDT"
+
+
+def tool_input(tool):
+    schema = tool.get("input_schema") or {}
+    properties = schema.get("properties", {})
+    return {name: _sample(name, properties.get(name, {})) for name in schema.get("required", [])}
+
+
+def _query_text(message):
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+
+def reply_blocks(body):
+    """Content blocks and stop reason of the reply to a request body."""
+    last = body["messages"][-1]
+    results = [
+        block for block in (last["content"] if isinstance(last["content"], list) else [])
+        if block.get("type") == "tool_result"
+    ]
+    if results:
+        return [{"type": "text", "text": f"Received {len(results)} tool results, here is the analysis."}], "end_turn"
+
+    query = _query_text(last)
+    calls = [tool for tool in body.get("tools", []) if tool["name"] in query]
+    if not calls:
+        return [{"type": "text", "text": f"You said: {query}"}], "end_turn"
+    blocks = [{"type": "text", "text": "Let me fetch that data."}]
+    blocks += [
+        {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:20]}", "name": tool["name"], "input": tool_input(tool)}
+        for tool in calls
+    ]
+    return blocks, "tool_use"
+
+
+def prefix_blocks(body):
+    """The request flattened in cache order: tools, system, then message blocks."""
+    blocks = list(body.get("tools", []))
+    system = body.get("system") or []
+    blocks += [{"type": "text", "text": system}] if isinstance(system, str) else system
+    for message in body["messages"]:
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        blocks += [{**block, "role": message["role"]} for block in content]
+    return blocks
+
+
+class PromptCache:
+    """Remembers request prefixes that ended at a cache_control breakpoint."""
+
+    def __init__(self):
+        self.prefixes = set()
+
+    def usage(self, body):
+        blocks = prefix_blocks(body)
+        total = sum(len(json.dumps(block)) for block in blocks) // 4
+        digest = hashlib.sha256()
+        tokens = 0
+        breakpoints = []
+        for block in blocks:
+            marked = "cache_control" in block
+            block = {key: value for key, value in block.items() if key != "cache_control"}
+            digest.update(json.dumps(block, sort_keys=True).encode())
+            tokens += len(json.dumps(block)) // 4
+            if marked:
+                breakpoints.append((digest.hexdigest(), tokens))
+        # The longest already cached prefix is read, newer breakpoints are written
+        read = max((tokens for key, tokens in breakpoints if key in self.prefixes), default=0)
+        written = max((tokens for key, tokens in breakpoints), default=0) - read
+        self.prefixes.update(key for key, _ in breakpoints)
+        return {
+            "breakpoints": len(breakpoints),
+            "input_tokens": max(total - read - written, 0),
+            "cache_read_input_tokens": read,
+            "cache_creation_input_tokens": max(written, 0),
+        }
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_events(body, blocks, stop_reason, usage, block_delay, chunk_delay):
+    message = {
+        "id": f"msg_{uuid.uuid4().hex[:20]}",
+        "type": "message",
+        "role": "assistant",
+        "content": [],
+        "model": body.get("model", "fake"),
+        "stop_reason": None,
+        "stop_sequence": None,
+        "usage": {**usage, "output_tokens": 1},
+    }
+    yield _sse("message_start", {"type": "message_start", "message": message})
+    for index, block in enumerate(blocks):
+        await asyncio.sleep(block_delay)
+        if block["type"] == "text":
+            yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": {"type": "text", "text": ""}})
+            for word in block["text"].split(" "):
+                await asyncio.sleep(chunk_delay)
+                yield _sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                   "delta": {"type": "text_delta", "text": word + " "}})
+        else:
+            yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": {**block, "input": {}}})
+            partial = json.dumps(block["input"])
+            for chunk in (partial[:len(partial) // 2], partial[len(partial) // 2:]):
+                await asyncio.sleep(chunk_delay)
+                yield _sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                   "delta": {"type": "input_json_delta", "partial_json": chunk}})
+        yield _sse("content_block_stop", {"type": "content_block_stop", "index": index})
+    yield _sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                 "usage": {"output_tokens": sum(len(json.dumps(b)) // 4 for b in blocks)}})
+    yield _sse("message_stop", {"type": "message_stop"})
+
+
+def create_app(block_delay=0.2, chunk_delay=0.01):
+    app = FastAPI(title="Fake Anthropic Messages API")
+    cache = PromptCache()
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        usage = cache.usage(body)
+        breakpoints = usage.pop("breakpoints")
+        if breakpoints > MAX_BREAKPOINTS:
+            return JSONResponse(status_code=400, content={"type": "error", "error": {
+                "type": "invalid_request_error",
+                "message": f"A maximum of {MAX_BREAKPOINTS} blocks with cache_control may be provided. Found {breakpoints}.",
+            }})
+        print(f"breakpoints={breakpoints} input={usage['input_tokens']} "
+              f"cache_read={usage['cache_read_input_tokens']} cache_write={usage['cache_creation_input_tokens']}")
+        blocks, stop_reason = reply_blocks(body)
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_events(body, blocks, stop_reason, usage, block_delay, chunk_delay),
+                media_type="text/event-stream",
+            )
+        await asyncio.sleep(block_delay * len(blocks))
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:20]}",
+            "type": "message",
+            "role": "assistant",
+            "content": blocks,
+            "model": body.get("model", "fake"),
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {**usage, "output_tokens": 1},
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--block-delay", type=float, default=0.2, help="seconds before each content block")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between streamed deltas")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.block_delay, args.chunk_delay), host=args.host, port=args.port)
@@ -0,0 +1,108 @@
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from utils.logger import logger
+from rate_limiter import rate_limiter
+from single_flight import make_key, single_flight
+
+URL = "https://api.binance.com/api/v3/"
+
+# Connection pool settings, overridable from the environment
+HTTP2 = os.environ.get("BINANCE_HTTP2", "true").lower() in ("1", "true", "yes")
+MAX_CONNECTIONS = int(os.environ.get("BINANCE_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("BINANCE_MAX_KEEPALIVE_CONNECTIONS", "10"))
+KEEPALIVE_EXPIRY = float(os.environ.get("BINANCE_KEEPALIVE_EXPIRY", "30"))
+TIMEOUT = float(os.environ.get("BINANCE_TIMEOUT", "10"))
+CONNECT_TIMEOUT = float(os.environ.get("BINANCE_CONNECT_TIMEOUT", "5"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_enabled():
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    if not HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("BINANCE_HTTP2 is enabled but `h2` is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def _build_client():
+    return httpx.AsyncClient(
+        base_url=URL,
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+def get_client():
+    """Return the shared client, creating it on first use.
+
+    Scripts that call the API functions directly get a client lazily; the MCP
+    server creates and closes it through `lifespan`.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start_client():
+    client = get_client()
+    logger.info(
+        f"Binance HTTP client started (max_connections={MAX_CONNECTIONS}, "
+        f"max_keepalive={MAX_KEEPALIVE_CONNECTIONS}, http2={_http2_enabled()})"
+    )
+    return client
+
+
+async def close_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Binance HTTP client closed")
+    _client = None
+
+
+async def _send(method, endpoint, params=None, headers=None):
+    client = get_client()
+    await rate_limiter.acquire(endpoint, params)
+    response = await client.request(method, endpoint, params=params, headers=headers)
+    await rate_limiter.update(response)
+    return response
+
+
+async def request(method, endpoint, params=None, headers=None):
+    """Send a request to `endpoint` (relative to URL) over the shared client.
+
+    The request waits for budget in the shared rate limiter first, and the
+    limiter's counters are updated from the response headers. Unsigned GETs
+    are public market data, so identical ones that are already in flight are
+    coalesced and share a single response.
+    """
+    if method.upper() == "GET" and not headers:
+        return await single_flight.do(
+            make_key(method, endpoint, params),
+            lambda: _send(method, endpoint, params=params),
+        )
+    return await _send(method, endpoint, params=params, headers=headers)
+
+
+@asynccontextmanager
+async def lifespan():
+    """Keep the shared client open for the duration of the block."""
+    await start_client()
+    try:
+        yield get_client()
+    finally:
+        await close_client()
@@ -0,0 +1,101 @@
+import io
+import os
+import threading
+import time
+from pathlib import Path
+
+from PIL import Image
+
+# Chart pane of a TradingView capture as (left, top, right, bottom) fractions
+# of the image, leaving out the header, watchlist and bottom panel
+TRADINGVIEW_CHART_BOX = tuple(
+    float(v) for v in os.environ.get("TRADINGVIEW_CHART_BOX", "0.044,0.06,0.727,0.937").split(",")
+)
+
+# format: "webp" or "png"; max_width: downscale wider images (None keeps size)
+PROFILES = {
+    "original": None,
+    "png": {"crop": True, "max_width": None, "format": "png"},
+    "balanced": {"crop": True, "max_width": 1280, "format": "webp", "quality": 82},
+    "compact": {"crop": True, "max_width": 800, "format": "webp", "quality": 70},
+}
+SCREENSHOT_PROFILE = os.environ.get("SCREENSHOT_PROFILE", "balanced")
+
+
+class ImagePipeline:
+    """Crops, downscales and re-encodes chart images before they are uploaded.
+
+    Output is written next to the source as `<name>.<profile>.<format>`,
+    never over the source, and carries no metadata (text chunks, EXIF, ICC profile). When re-encoding
+    does not make the image smaller, the source is kept as is.
+    """
+
+    def __init__(self, profile=SCREENSHOT_PROFILE):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown image profile {profile!r}, expected one of {sorted(PROFILES)}")
+        self.profile = profile
+        self._lock = threading.Lock()
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def process(self, path, crop_box=None, profile=None):
+        """Optimize the image at `path`; returns (output path, report dict)."""
+        profile = profile or self.profile
+        settings = PROFILES[profile]
+        started = time.perf_counter()
+        bytes_in = os.path.getsize(path)
+        if settings is None:
+            return path, {"profile": profile, "bytes_in": bytes_in, "bytes_out": bytes_in, "saved_pct": 0.0, "ms": 0.0}
+
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+        if settings["crop"] and crop_box:
+            width, height = image.size
+            left, top, right, bottom = crop_box
+            image = image.crop((round(left * width), round(top * height), round(right * width), round(bottom * height)))
+        max_width = settings["max_width"]
+        if max_width and image.width > max_width:
+            image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+
+        encoded = io.BytesIO()
+        if settings["format"] == "webp":
+            image.save(encoded, "WEBP", quality=settings["quality"], method=4)
+        else:
+            # Chart colours fit a palette; quantizing shrinks PNGs several times over
+            image.quantize(colors=256, method=Image.Quantize.MEDIANCUT).save(encoded, "PNG", optimize=True)
+
+        # Flat rendered charts can already be smaller than any re-encoding
+        output, bytes_out = str(path), bytes_in
+        if encoded.tell() < bytes_in:
+            output = str(Path(path).with_suffix(f".{profile}.{settings['format']}"))
+            Path(output).write_bytes(encoded.getvalue())
+            bytes_out = encoded.tell()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.images += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.seconds += elapsed
+        return output, {
+            "profile": profile,
+            "kept_original": output == str(path),
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "saved_pct": round((1 - bytes_out / bytes_in) * 100, 1) if bytes_in else 0.0,
+            "ms": round(elapsed * 1000, 1),
+        }
+
+    def stats(self):
+        return {
+            "profile": self.profile,
+            "images": self.images,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "saved_pct": round((1 - self.bytes_out / self.bytes_in) * 100, 1) if self.bytes_in else 0.0,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+image_pipeline = ImagePipeline()
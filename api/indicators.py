@@ -0,0 +1,241 @@
+"""Vectorized technical indicators over kline data.
+
+Every indicator takes arrays shaped (..., time), so a batch of equally long
+series (many symbols/intervals stacked into one 2D array) is computed in a
+single pass. Leading values without enough history are NaN.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Block length for the exponential smoothing recurrences
+EMA_BLOCK = 128
+
+
+def _as_float(values):
+    return np.asarray(values, dtype=float)
+
+
+def smooth(values, alpha):
+    """Exponential smoothing y[t] = alpha * x[t] + (1 - alpha) * y[t-1], y[0] = x[0].
+
+    The recurrence is unrolled over blocks of EMA_BLOCK samples: inside a
+    block each output is a fixed weighted sum of the block's inputs plus the
+    decayed carry from the previous block, i.e. one matrix product per block
+    instead of one Python step per sample. All weights are <= 1, so it stays
+    numerically stable for any alpha.
+    """
+    x = _as_float(values)
+    out = np.empty_like(x)
+    if x.shape[-1] == 0:
+        return out
+    steps = np.arange(EMA_BLOCK)
+    lag = steps[:, None] - steps[None, :]
+    weights = np.where(lag >= 0, alpha * (1 - alpha) ** np.maximum(lag, 0), 0.0)
+    carry = (1 - alpha) ** (steps + 1)
+    prev = x[..., 0]
+    for start in range(0, x.shape[-1], EMA_BLOCK):
+        block = x[..., start:start + EMA_BLOCK]
+        m = block.shape[-1]
+        y = block @ weights[:m, :m].T + prev[..., None] * carry[:m]
+        out[..., start:start + m] = y
+        prev = y[..., -1]
+    return out
+
+
+def ema(values, period):
+    return smooth(values, 2 / (period + 1))
+
+
+def sma(values, period):
+    x = _as_float(values)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] < period:
+        return out
+    csum = np.cumsum(x, axis=-1)
+    out[..., period - 1] = csum[..., period - 1]
+    out[..., period:] = csum[..., period:] - csum[..., :-period]
+    return out / period
+
+
+def rolling_std(values, period):
+    x = _as_float(values)
+    mean = sma(x, period)
+    mean_sq = sma(x * x, period)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0))
+
+
+def rsi(close, period=14):
+    """Wilder's RSI."""
+    close = _as_float(close)
+    delta = np.diff(close, axis=-1, prepend=close[..., :1])
+    avg_gain = smooth(np.maximum(delta, 0), 1 / period)
+    avg_loss = smooth(np.maximum(-delta, 0), 1 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100 - 100 / (1 + avg_gain / avg_loss)
+    # No losses: 100 after gains, neutral 50 for a flat series
+    out = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), out)
+    out[..., :period] = np.nan
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD line, signal line and histogram."""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, period=20, width=2.0):
+    """Upper, middle and lower Bollinger bands."""
+    middle = sma(close, period)
+    std = rolling_std(close, period)
+    return middle + width * std, middle, middle - width * std
+
+
+def true_range(high, low, close):
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    prev_close = np.concatenate([close[..., :1], close[..., :-1]], axis=-1)
+    return np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr(high, low, close, period=14):
+    """Wilder's average true range."""
+    out = smooth(true_range(high, low, close), 1 / period)
+    out[..., :period - 1] = np.nan
+    return out
+
+
+def vwap(high, low, close, volume):
+    """Volume weighted average price anchored at the first candle."""
+    typical = (_as_float(high) + _as_float(low) + _as_float(close)) / 3
+    volume = _as_float(volume)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.cumsum(typical * volume, axis=-1) / np.cumsum(volume, axis=-1)
+
+
+def pivots(high, low, close):
+    """Classic floor pivots from the previous period: the last candle of each
+    series is the one still forming, so the second to last is used."""
+    h, l, c = _as_float(high)[..., -2], _as_float(low)[..., -2], _as_float(close)[..., -2]
+    p = (h + l + c) / 3
+    return {
+        "P": p,
+        "R1": 2 * p - l,
+        "S1": 2 * p - h,
+        "R2": p + (h - l),
+        "S2": p - (h - l),
+    }
+
+
+def swing_levels(high, low, window=5):
+    """Boolean masks of swing highs and lows (extremes of a centred window)."""
+    high, low = _as_float(high), _as_float(low)
+    size = 2 * window + 1
+    is_high = np.zeros(high.shape, dtype=bool)
+    is_low = np.zeros(low.shape, dtype=bool)
+    if high.shape[-1] >= size:
+        is_high[..., window:-window] = high[..., window:-window] == sliding_window_view(high, size, axis=-1).max(axis=-1)
+        is_low[..., window:-window] = low[..., window:-window] == sliding_window_view(low, size, axis=-1).min(axis=-1)
+    return is_high, is_low
+
+
+def volume_profile(close, volume, bins=24, value_area=0.7):
+    """Point of control and value area of one series' volume-by-price histogram."""
+    close, volume = _as_float(close), _as_float(volume)
+    hist, edges = np.histogram(close, bins=bins, weights=volume)
+    centers = (edges[:-1] + edges[1:]) / 2
+    poc = int(np.argmax(hist))
+    # Grow the value area outwards from the point of control
+    lo = hi = poc
+    total, target = hist[poc], hist.sum() * value_area
+    while total < target and (lo > 0 or hi < bins - 1):
+        below = hist[lo - 1] if lo > 0 else -1
+        above = hist[hi + 1] if hi < bins - 1 else -1
+        if above >= below:
+            hi += 1
+            total += hist[hi]
+        else:
+            lo -= 1
+            total += hist[lo]
+    return {"poc": centers[poc], "val": edges[lo], "vah": edges[hi + 1]}
+
+
+def _round(value):
+    value = float(value)
+    return None if np.isnan(value) else float(f"{value:.6g}")
+
+
+def _nearest(levels, price, above, count=3):
+    levels = np.unique(levels)
+    picked = levels[levels > price] if above else levels[levels < price][::-1]
+    return [_round(level) for level in picked[:count]]
+
+
+def summarize_batch(klines_batch):
+    """Compact indicator summaries for equally long kline lists.
+
+    `klines_batch` is a list of Binance kline lists (all the same length);
+    the indicators are computed for the whole batch at once.
+    """
+    data = np.array([[k[1:6] for k in klines] for klines in klines_batch], dtype=float)
+    high, low, close, volume = (data[..., i] for i in range(1, 5))
+
+    sma20, sma50 = sma(close, 20), sma(close, 50)
+    ema20, ema50 = ema(close, 20), ema(close, 50)
+    rsi14 = rsi(close)
+    macd_line, macd_signal, macd_hist = macd(close)
+    bb_upper, bb_mid, bb_lower = bollinger(close)
+    atr14 = atr(high, low, close)
+    vwap_ = vwap(high, low, close, volume)
+    pivot = pivots(high, low, close)
+    swing_high, swing_low = swing_levels(high, low)
+
+    summaries = []
+    for i in range(len(klines_batch)):
+        last = close[i, -1]
+        band = bb_upper[i, -1] - bb_lower[i, -1]
+        summaries.append({
+            "close": _round(last),
+            "change_pct": _round((last / close[i, 0] - 1) * 100),
+            "trend": "bullish" if last > ema50[i, -1] and ema20[i, -1] > ema50[i, -1]
+            else "bearish" if last < ema50[i, -1] and ema20[i, -1] < ema50[i, -1]
+            else "sideways",
+            "sma20": _round(sma20[i, -1]),
+            "sma50": _round(sma50[i, -1]),
+            "ema20": _round(ema20[i, -1]),
+            "ema50": _round(ema50[i, -1]),
+            "rsi14": _round(rsi14[i, -1]),
+            "macd": {
+                "line": _round(macd_line[i, -1]),
+                "signal": _round(macd_signal[i, -1]),
+                "hist": _round(macd_hist[i, -1]),
+            },
+            "bollinger": {
+                "upper": _round(bb_upper[i, -1]),
+                "middle": _round(bb_mid[i, -1]),
+                "lower": _round(bb_lower[i, -1]),
+                "percent_b": _round((last - bb_lower[i, -1]) / band) if band else None,
+            },
+            "atr14": _round(atr14[i, -1]),
+            "vwap": _round(vwap_[i, -1]),
+            "pivots": {name: _round(level[i]) for name, level in pivot.items()},
+            "resistance": _nearest(high[i][swing_high[i]], last, above=True),
+            "support": _nearest(low[i][swing_low[i]], last, above=False),
+            "volume_profile": {
+                name: _round(value) for name, value in volume_profile(close[i], volume[i]).items()
+            },
+        })
+    return summaries
+
+
+def summarize(klines_by_key):
+    """Summaries for {key: klines}, batching series that have the same length."""
+    by_length = {}
+    for key, klines in klines_by_key.items():
+        if len(klines) >= 2:
+            by_length.setdefault(len(klines), []).append(key)
+    results = {key: None for key in klines_by_key}
+    for keys in by_length.values():
+        for key, summary in zip(keys, summarize_batch([klines_by_key[key] for key in keys])):
+            results[key] = summary
+    return results
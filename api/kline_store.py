@@ -0,0 +1,309 @@
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+from utils.logger import logger
+from klines import backfill_klines, now_ms
+
+KLINE_STORE_DIR = os.environ.get(
+    "KLINE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "klines"),
+)
+
+# Fixed-width columns: (name, array typecode, index in a Binance kline row)
+COLUMNS = [
+    ("open_time", "q", 0),
+    ("open", "d", 1),
+    ("high", "d", 2),
+    ("low", "d", 3),
+    ("close", "d", 4),
+    ("volume", "d", 5),
+    ("close_time", "q", 6),
+    ("quote_volume", "d", 7),
+    ("trades", "q", 8),
+    ("taker_buy_base_volume", "d", 9),
+    ("taker_buy_quote_volume", "d", 10),
+]
+
+
+def _interval_dir(interval):
+    # "1m" and "1M" would collide on case-insensitive filesystems
+    return "1mo" if interval == "1M" else interval
+
+
+class KlineSeries:
+    """On-disk candles for one (symbol, interval), one binary file per column.
+
+    `meta.json` records the time range the files cover completely, so any
+    request inside it can be answered without asking the exchange, even
+    where the exchange itself has no candles (e.g. maintenance windows).
+
+    Several MCP server processes can share the files, so reads and writes
+    hold an fcntl lock on the series and re-read `meta.json` under it.
+    """
+
+    def __init__(self, root, symbol, interval):
+        self.symbol = symbol
+        self.interval = interval
+        self.path = os.path.join(root, symbol, _interval_dir(interval))
+        self.lock = asyncio.Lock()
+        self.meta = self._load_meta()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.path, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def locked(self, exclusive=False):
+        """Hold the cross-process lock of the series with a fresh `meta`."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self.meta = self._load_meta()
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def refresh(self):
+        if os.path.isdir(self.path):
+            with self.locked():
+                pass
+
+    def _write_meta(self, covered_start, covered_end, count):
+        meta = {"covered_start": covered_start, "covered_end": covered_end, "count": count}
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+        self.meta = meta
+
+    def touches(self, start_time, end_time):
+        """Whether [start_time, end_time] overlaps or adjoins the covered range."""
+        return (
+            self.meta is not None
+            and start_time <= self.meta["covered_end"] + 1
+            and end_time >= self.meta["covered_start"] - 1
+        )
+
+    def covers(self, start_time, end_time):
+        return (
+            self.meta is not None
+            and self.meta["covered_start"] <= start_time
+            and end_time <= self.meta["covered_end"]
+        )
+
+    @contextmanager
+    def columns(self):
+        """Memory-map every column and yield them as typed memoryviews.
+
+        Call under `locked`; columns are cut to `meta["count"]` rows.
+        """
+        maps, casts, views = [], [], {}
+        try:
+            if self.meta and self.meta["count"]:
+                for name, typecode, _ in COLUMNS:
+                    with open(self._column_path(name), "rb") as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    maps.append(mapped)
+                    casts.append(memoryview(mapped).cast(typecode))
+                    views[name] = casts[-1][:self.meta["count"]]
+            yield views
+        finally:
+            for view in list(views.values()) + casts:
+                view.release()
+            for mapped in maps:
+                mapped.close()
+
+    def read(self, start_time, end_time, limit=None):
+        """Return Binance-format klines with an open time in [start_time, end_time],
+        or None if the range is not fully covered."""
+        if not os.path.isdir(self.path):
+            self.meta = None
+            return None
+        with self.locked():
+            if not self.covers(start_time, end_time):
+                return None
+            return self._read(start_time, end_time, limit)
+
+    def _read(self, start_time, end_time, limit=None):
+        with self.columns() as cols:
+            if not cols:
+                return []
+            open_times = cols["open_time"]
+            lo = bisect_left(open_times, start_time)
+            hi = bisect_right(open_times, end_time)
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            return [
+                [
+                    open_times[i],
+                    f"{cols['open'][i]:.8f}",
+                    f"{cols['high'][i]:.8f}",
+                    f"{cols['low'][i]:.8f}",
+                    f"{cols['close'][i]:.8f}",
+                    f"{cols['volume'][i]:.8f}",
+                    cols["close_time"][i],
+                    f"{cols['quote_volume'][i]:.8f}",
+                    cols["trades"][i],
+                    f"{cols['taker_buy_base_volume'][i]:.8f}",
+                    f"{cols['taker_buy_quote_volume'][i]:.8f}",
+                    "0",
+                ]
+                for i in range(lo, hi)
+            ]
+
+    def _to_arrays(self, klines):
+        arrays = {name: array(typecode) for name, typecode, _ in COLUMNS}
+        for kline in klines:
+            for name, typecode, index in COLUMNS:
+                value = kline[index]
+                arrays[name].append(int(value) if typecode == "q" else float(value))
+        return arrays
+
+    def store(self, klines, covered_start, covered_end):
+        """Merge candles that cover [covered_start, covered_end] into the series.
+
+        Another process may have stored more since this one last looked, so
+        the merge is planned against the meta read under the write lock.
+        Returns False, storing nothing, when the range no longer touches the
+        stored one; the caller syncs again to fetch the gap.
+        """
+        with self.locked(exclusive=True):
+            meta = self.meta
+            if meta is None:
+                self._rewrite(klines, covered_start, covered_end)
+            elif covered_end < meta["covered_start"] - 1 or covered_start > meta["covered_end"] + 1:
+                return False
+            elif covered_start >= meta["covered_start"]:
+                if covered_end > meta["covered_end"]:
+                    self._append([k for k in klines if k[0] > meta["covered_end"]], covered_end)
+            else:
+                stored = self._read(meta["covered_start"], meta["covered_end"])
+                merged = {k[0]: k for k in klines}
+                merged.update((k[0], k) for k in stored)
+                self._rewrite(
+                    [merged[t] for t in sorted(merged)],
+                    covered_start,
+                    max(covered_end, meta["covered_end"]),
+                )
+            return True
+
+    def _append(self, klines, covered_end):
+        """Append candles newer than everything stored and extend the covered range."""
+        arrays = self._to_arrays(klines)
+        for name, _, _ in COLUMNS:
+            # Drop rows an interrupted append left beyond meta["count"]
+            os.truncate(self._column_path(name), self.meta["count"] * arrays[name].itemsize)
+            with open(self._column_path(name), "ab") as f:
+                arrays[name].tofile(f)
+        self._write_meta(self.meta["covered_start"], covered_end, self.meta["count"] + len(klines))
+
+    def _rewrite(self, klines, covered_start, covered_end):
+        """Replace the stored candles with `klines`."""
+        arrays = self._to_arrays(klines)
+        for name, _, _ in COLUMNS:
+            tmp_path = self._column_path(name) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                arrays[name].tofile(f)
+            os.replace(tmp_path, self._column_path(name))
+        self._write_meta(covered_start, covered_end, len(klines))
+
+
+def _closed(klines, end_time):
+    """Split off candles that are still open; returns (closed, open, end of the closed range)."""
+    now = now_ms()
+    closed = [k for k in klines if k[6] < now]
+    if len(closed) < len(klines):
+        end_time = min(end_time, klines[len(closed)][0] - 1)
+    return closed, klines[len(closed):], min(end_time, now)
+
+
+class KlineStore:
+    """Local store of closed candles, synced incrementally from /klines."""
+
+    def __init__(self, root=KLINE_STORE_DIR):
+        self.root = root
+        self._series = {}
+
+    def series(self, symbol, interval):
+        key = (symbol.upper(), interval)
+        if key not in self._series:
+            self._series[key] = KlineSeries(self.root, *key)
+        return self._series[key]
+
+    def read(self, symbol, interval, start_time, end_time, limit=None):
+        """Return stored klines for the range, or None if it is not fully covered."""
+        return self.series(symbol, interval).read(start_time, end_time, limit)
+
+    async def sync(self, symbol, interval, start_time, end_time=None):
+        """Make sure every closed candle in [start_time, end_time] is stored.
+
+        Only the missing head and tail of the range are downloaded: new
+        candles are appended to the column files, and older history
+        triggers a rewrite. Returns the still-open candles fetched past the
+        stored range, so callers need not download them again.
+
+        A range that neither overlaps nor adjoins the stored one is not
+        synced and None is returned: filling the gap in between could take
+        far more requests than the range itself.
+        """
+        series = self.series(symbol, interval)
+        end_time = min(end_time if end_time is not None else now_ms(), now_ms())
+        async with series.lock:
+            while True:
+                await asyncio.to_thread(series.refresh)
+                if series.meta is not None and not series.touches(start_time, end_time):
+                    return None
+                open_klines = await self._sync_once(series, start_time, end_time)
+                if open_klines is not None:
+                    return open_klines
+                logger.info(f"Kline store: {series.symbol} {interval} changed in another process, syncing again")
+
+    async def _sync_once(self, series, start_time, end_time):
+        """Download and store what the range is missing; returns the open candles
+        fetched, or None when another process changed the series meanwhile."""
+        interval = series.interval
+        if series.meta is None:
+            klines, open_klines, covered_end = _closed(
+                await backfill_klines(series.symbol, interval, start_time, end_time), end_time
+            )
+            if covered_end < start_time:
+                # Nothing in the range has closed yet
+                return open_klines
+            if not await asyncio.to_thread(series.store, klines, start_time, covered_end):
+                return None
+            logger.info(f"Kline store: stored {len(klines)} {series.symbol} {interval} candles")
+            return open_klines
+
+        covered_start = series.meta["covered_start"]
+        covered_end = series.meta["covered_end"]
+        if start_time < covered_start:
+            head = await backfill_klines(series.symbol, interval, start_time, covered_start - 1)
+            if not await asyncio.to_thread(series.store, head, start_time, covered_start - 1):
+                return None
+            logger.info(f"Kline store: prepended {len(head)} {series.symbol} {interval} candles")
+        open_klines = []
+        if end_time > covered_end:
+            tail, open_klines, new_end = _closed(
+                await backfill_klines(series.symbol, interval, covered_end + 1, end_time), end_time
+            )
+            if new_end > covered_end:
+                if not await asyncio.to_thread(series.store, tail, covered_end + 1, new_end):
+                    return None
+                logger.info(f"Kline store: appended {len(tail)} {series.symbol} {interval} candles")
+        return open_klines
+
+
+kline_store = KlineStore()
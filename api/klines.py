@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+
+from http_client import request
+from utils.fastjson import loads
+
+# Maximum number of candles Binance returns for one /klines request
+PAGE_LIMIT = 1000
+KLINE_BACKFILL_CONCURRENCY = int(os.environ.get("KLINE_BACKFILL_CONCURRENCY", "5"))
+KLINE_BACKFILL_MAX_PAGES = int(os.environ.get("KLINE_BACKFILL_MAX_PAGES", "200"))
+
+SECOND = 1000
+MINUTE = 60 * SECOND
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# Interval lengths in milliseconds. Months vary in length, so "1M" uses the
+# longest month; that only makes page windows a little wider than needed.
+INTERVAL_MS = {
+    "1s": SECOND,
+    "1m": MINUTE,
+    "3m": 3 * MINUTE,
+    "5m": 5 * MINUTE,
+    "15m": 15 * MINUTE,
+    "30m": 30 * MINUTE,
+    "1h": HOUR,
+    "2h": 2 * HOUR,
+    "4h": 4 * HOUR,
+    "6h": 6 * HOUR,
+    "8h": 8 * HOUR,
+    "12h": 12 * HOUR,
+    "1d": DAY,
+    "3d": 3 * DAY,
+    "1w": 7 * DAY,
+    "1M": 31 * DAY,
+}
+
+COMPACT_COLUMNS = ["openTime", "open", "high", "low", "close", "volume", "trades"]
+
+
+def interval_ms(interval):
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported interval: {interval}")
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def page_windows(start_time, end_time, interval):
+    """Split [start_time, end_time] into windows of at most PAGE_LIMIT candles."""
+    span = PAGE_LIMIT * interval_ms(interval)
+    windows = []
+    start = start_time
+    while start <= end_time:
+        windows.append((start, min(start + span - 1, end_time)))
+        start += span
+    return windows
+
+
+async def fetch_klines(symbol, interval, start_time=None, end_time=None, limit=PAGE_LIMIT):
+    """Fetch one page of klines as parsed rows."""
+    params = {
+        "symbol": symbol,
+        "interval": interval,
+        "startTime": start_time,
+        "endTime": end_time,
+        "limit": limit,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+    response = await request("GET", "klines", params=params)
+    data = loads(response.content)
+    if isinstance(data, dict):
+        raise ValueError(f"Binance error {data.get('code')}: {data.get('msg')}")
+    return data
+
+
+def merge_klines(pages):
+    """Merge pages of klines, dropping duplicate open times and sorting them."""
+    by_open_time = {}
+    for page in pages:
+        for kline in page:
+            by_open_time[kline[0]] = kline
+    return [by_open_time[open_time] for open_time in sorted(by_open_time)]
+
+
+async def backfill_klines(
+    symbol, interval, start_time, end_time=None, max_concurrency=KLINE_BACKFILL_CONCURRENCY
+):
+    """Fetch every kline in [start_time, end_time], beyond the one page limit.
+
+    Page windows are fetched concurrently (at most `max_concurrency` at a
+    time, each still going through the shared rate limiter) and merged into a
+    single de-duplicated list ordered by open time.
+    """
+    end_time = now_ms() if end_time is None else end_time
+    if end_time < start_time:
+        raise ValueError("endTime must not be before startTime")
+    windows = page_windows(start_time, end_time, interval)
+    if len(windows) > KLINE_BACKFILL_MAX_PAGES:
+        raise ValueError(
+            f"Range needs {len(windows)} pages, more than the limit of {KLINE_BACKFILL_MAX_PAGES}"
+        )
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_window(window):
+        async with semaphore:
+            return await fetch_klines(symbol, interval, window[0], window[1])
+
+    pages = await asyncio.gather(*(fetch_window(window) for window in windows))
+    return merge_klines(pages)
+
+
+def compact_klines(klines):
+    """Reduce raw kline rows to COMPACT_COLUMNS with numeric values."""
+    return [
+        [kline[0], float(kline[1]), float(kline[2]), float(kline[3]),
+         float(kline[4]), float(kline[5]), kline[8]]
+        for kline in klines
+    ]
@@ -1,18 +1,22 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from contextlib import asynccontextmanager
 from mcp_client import MCPClient
+from mcp_pool import MCP_POOL_SIZE
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 import uvicorn
+import uuid
 
 load_dotenv()
 
 
 class Settings(BaseSettings):
     server_script_path: str = "./mcp_server.py"
+    # MCP server subprocesses shared by concurrent /query requests
+    mcp_pool_size: int = MCP_POOL_SIZE
 
 
 settings = Settings()
@@ -22,7 +26,9 @@ settings = Settings()
 async def lifespan(app: FastAPI):
     client = MCPClient()
     try:
-        connected = await client.connect_to_server(settings.server_script_path)
+        connected = await client.connect_to_server(
+            settings.server_script_path, settings.mcp_pool_size
+        )
         if not connected:
             raise HTTPException(
                 status_code=500, detail="Failed to connect to MCP server"
@@ -53,6 +59,9 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
     chat_history: list = []
+    # Continue a journaled conversation (instead of sending chat_history);
+    # a new one is started when omitted
+    conversation_id: Optional[str] = None
 
 
 class Message(BaseModel):
@@ -68,11 +77,17 @@ class ToolCall(BaseModel):
 @app.post("/query", response_model=Dict[str, Any])
 async def process_query(request: QueryRequest):
     """Process a query and return the response"""
+    if request.conversation_id and request.chat_history:
+        # The journal already holds the history; a second copy would not line up with it
+        raise HTTPException(status_code=400, detail="Send either chat_history or conversation_id, not both")
     try:
+        conversation_id = request.conversation_id or uuid.uuid4().hex
         messages = await app.state.client.process_query(
-            request.query, request.chat_history
+            request.query,
+            request.chat_history,
+            conversation_id,
         )
-        return {"messages": messages}
+        return {"conversation_id": conversation_id, "messages": messages}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -96,5 +111,30 @@ async def get_tools():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/pool")
+async def get_pool():
+    """Get the state of the MCP server session pool"""
+    return app.state.client.pool.stats()
+
+
+@app.get("/tool-cache")
+async def get_tool_cache():
+    """Get hit rate and size of the tool result cache"""
+    return app.state.client.tool_cache.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Get LLM token usage (including prompt cache reads and writes) and client metrics"""
+    client = app.state.client
+    return {
+        "llm": client.usage.stats(),
+        "tool_cache": client.tool_cache.stats(),
+        "pool": client.pool.stats(),
+        "journal": client.journal.stats(),
+        "tool_router": client.router.stats(),
+    }
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,254 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+
+import websockets
+from utils.logger import logger
+from utils.fastjson import dumps, loads
+
+BINANCE_WS_URL = os.environ.get("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+# Comma separated watchlist, e.g. "BTCUSDT,ETHUSDT"; the stream is off when empty
+MARKET_STREAM_SYMBOLS = os.environ.get("MARKET_STREAM_SYMBOLS", "")
+# The @ticker stream pushes every second, so older tickers mean a stalled feed
+MARKET_STREAM_MAX_AGE = float(os.environ.get("MARKET_STREAM_MAX_AGE", "5"))
+TRADE_BUFFER_SIZE = int(os.environ.get("MARKET_STREAM_TRADE_BUFFER", "200"))
+RECONNECT_MAX_DELAY = 60
+
+STREAM_KINDS = ("ticker", "bookTicker", "aggTrade")
+
+# @ticker event field -> GET /api/v3/ticker/24hr field
+TICKER_24HR_FIELDS = {
+    "s": "symbol",
+    "p": "priceChange",
+    "P": "priceChangePercent",
+    "w": "weightedAvgPrice",
+    "x": "prevClosePrice",
+    "c": "lastPrice",
+    "Q": "lastQty",
+    "b": "bidPrice",
+    "B": "bidQty",
+    "a": "askPrice",
+    "A": "askQty",
+    "o": "openPrice",
+    "h": "highPrice",
+    "l": "lowPrice",
+    "v": "volume",
+    "q": "quoteVolume",
+    "O": "openTime",
+    "C": "closeTime",
+    "F": "firstId",
+    "L": "lastId",
+    "n": "count",
+}
+AGG_TRADE_FIELDS = ("a", "p", "q", "f", "l", "T", "m", "M")
+
+
+class SymbolState:
+    """Latest stream data for one symbol."""
+
+    def __init__(self, trade_buffer_size):
+        self.ticker = None
+        self.ticker_at = 0.0
+        self.book_ticker = None
+        self.book_ticker_at = 0.0
+        self.trades = deque(maxlen=trade_buffer_size)
+
+
+class MarketStream:
+    """Background subscription to Binance combined streams for a watchlist.
+
+    Keeps the latest 24hr ticker, book ticker and a ring buffer of aggregate
+    trades per symbol. The connection is re-established with exponential
+    backoff; every subscription is part of the connect URL, so reconnecting
+    also resubscribes. Readers get None whenever the data may be stale and
+    should fall back to REST.
+    """
+
+    def __init__(
+        self,
+        symbols=(),
+        url=BINANCE_WS_URL,
+        max_age=MARKET_STREAM_MAX_AGE,
+        trade_buffer_size=TRADE_BUFFER_SIZE,
+    ):
+        self.url = url
+        self.max_age = max_age
+        self.trade_buffer_size = trade_buffer_size
+        self.states = {}
+        self.connected = False
+        self.connected_at = 0.0
+        self.reconnects = 0
+        self.messages = 0
+        self.kinds = list(STREAM_KINDS)
+        self._handlers = {}
+        self._reconnect_callbacks = []
+        self._ws = None
+        self._task = None
+        self._request_ids = itertools.count(1)
+        for symbol in symbols:
+            self.states[symbol.upper()] = SymbolState(trade_buffer_size)
+
+    def _streams(self, symbols):
+        return [f"{symbol.lower()}@{kind}" for symbol in symbols for kind in self.kinds]
+
+    def add_handler(self, kind, handler, on_reconnect=None):
+        """Subscribe every watched symbol to `kind` and pass its events to `handler`.
+
+        `on_reconnect` is called after each (re)connect, since events sent
+        while disconnected are lost.
+        """
+        if kind not in self.kinds:
+            self.kinds.append(kind)
+        self._handlers[kind] = handler
+        if on_reconnect is not None:
+            self._reconnect_callbacks.append(on_reconnect)
+
+    @property
+    def stream_url(self):
+        return f"{self.url}/stream?streams={'/'.join(self._streams(self.states))}"
+
+    async def start(self):
+        if self.states and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def subscribe(self, symbols):
+        """Add symbols to the watchlist, subscribing on the live connection too."""
+        new = [symbol.upper() for symbol in symbols if symbol.upper() not in self.states]
+        for symbol in new:
+            self.states[symbol] = SymbolState(self.trade_buffer_size)
+        if not new:
+            return
+        if self._task is None:
+            await self.start()
+        elif self._ws is not None:
+            await self._ws.send(dumps({
+                "method": "SUBSCRIBE",
+                "params": self._streams(new),
+                "id": next(self._request_ids),
+            }))
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                async with websockets.connect(self.stream_url, ping_interval=20) as ws:
+                    self._on_connect(ws)
+                    delay = 1
+                    async for raw in ws:
+                        self._handle(loads(raw))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Market stream disconnected: {e}")
+            finally:
+                self._ws = None
+                self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _on_connect(self, ws):
+        self._ws = ws
+        self.connected = True
+        self.connected_at = time.monotonic()
+        # Trades from before the reconnect may have a gap after them
+        for state in self.states.values():
+            state.trades.clear()
+        for callback in self._reconnect_callbacks:
+            callback()
+        logger.info(f"Market stream connected for {sorted(self.states)}")
+
+    def _handle(self, message):
+        if "stream" not in message:
+            # Replies to SUBSCRIBE requests
+            return
+        self.messages += 1
+        data = message["data"]
+        state = self.states.get(data.get("s"))
+        if state is None:
+            return
+        kind = message["stream"].split("@", 1)[1]
+        now = time.monotonic()
+        if kind == "ticker":
+            state.ticker = data
+            state.ticker_at = now
+        elif kind == "bookTicker":
+            state.book_ticker = data
+            state.book_ticker_at = now
+        elif kind == "aggTrade":
+            state.trades.append(data)
+        elif kind in self._handlers:
+            self._handlers[kind](data)
+
+    def _state(self, symbol):
+        if not self.connected:
+            return None
+        return self.states.get(symbol.upper())
+
+    def ticker_24hr(self, symbol):
+        """Latest 24hr ticker in the GET /ticker/24hr shape, or None if stale."""
+        state = self._state(symbol)
+        if state is None or state.ticker is None or time.monotonic() - state.ticker_at > self.max_age:
+            return None
+        return {field: state.ticker[key] for key, field in TICKER_24HR_FIELDS.items()}
+
+    def price_ticker(self, symbol):
+        """Latest price in the GET /ticker/price shape, or None if stale."""
+        ticker = self.ticker_24hr(symbol)
+        if ticker is None:
+            return None
+        return {"symbol": ticker["symbol"], "price": ticker["lastPrice"]}
+
+    def book_ticker(self, symbol):
+        """Best bid/ask in the GET /ticker/bookTicker shape, or None if stale.
+
+        Book tickers are only pushed on change, so any update received on
+        the current connection is still the current top of book.
+        """
+        state = self._state(symbol)
+        if state is None or state.book_ticker is None or state.book_ticker_at < self.connected_at:
+            return None
+        data = state.book_ticker
+        return {
+            "symbol": data["s"],
+            "bidPrice": data["b"],
+            "bidQty": data["B"],
+            "askPrice": data["a"],
+            "askQty": data["A"],
+        }
+
+    def agg_trades(self, symbol, limit):
+        """The last `limit` aggregate trades in the GET /aggTrades shape, or None.
+
+        The buffer is cleared on reconnect, so it is gap-free once it holds
+        `limit` trades.
+        """
+        state = self._state(symbol)
+        if state is None or len(state.trades) < limit:
+            return None
+        trades = list(state.trades)[-limit:]
+        return [{key: trade[key] for key in AGG_TRADE_FIELDS} for trade in trades]
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "symbols": sorted(self.states),
+            "messages": self.messages,
+            "reconnects": self.reconnects,
+        }
+
+
+market_stream = MarketStream(
+    [symbol.strip() for symbol in MARKET_STREAM_SYMBOLS.split(",") if symbol.strip()]
+)
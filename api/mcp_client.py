@@ -1,15 +1,19 @@
 from typing import Optional, List
-from contextlib import AsyncExitStack
 import traceback
 # from utils.logger import logger
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from datetime import datetime
 from utils.logger import logger
-import json
+from mcp_pool import MCP_POOL_SIZE, MCPSessionPool
+from tool_cache import ToolResultCache
+from conversation_journal import ConversationJournal
+from context_budget import ContextBudget, ContextState
+from prompt_cache import PROMPT_CACHING, LLMUsage, cache_messages, cache_system, cache_tools
+from tool_router import REQUEST_TOOLS_NAME, TOOL_ROUTING, ToolRouter
+import asyncio
 import os
+import time
+import uuid
 
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from anthropic.types import Message
 from openai import OpenAI
 
@@ -43,41 +47,60 @@ Your goal is to maximize clarity, reliability, and practical value in every inte
 
 
 
+LLM_MODEL = os.environ.get("LLM_MODEL", "claude-3-5-sonnet-latest")
+LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", "1000"))
+# Stream responses so tools start while the rest of the turn is generated
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+# Tool calls of one turn that may run at the same time
+TOOL_CONCURRENCY = int(os.environ.get("TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.environ.get("TOOL_TIMEOUT", "30"))
+# Tools that legitimately take longer than TOOL_TIMEOUT
+TOOL_TIMEOUTS = {
+    "takeScreenShotOfTarde": float(os.environ.get("SCREENSHOT_TOOL_TIMEOUT", "180")),
+    "bb7_getTradeDataRange": 120.0,
+    "bb7_TechnicalIndicators": 60.0,
+    "bb7_MultiTimeframe": 60.0,
+}
+
+
+class Conversation:
+    """Message history of one query, so concurrent requests never share state."""
+
+    def __init__(self, query: str, chat_history: Optional[list] = None, conversation_id: Optional[str] = None):
+        self.id = conversation_id or uuid.uuid4().hex
+        self.context = ContextState()
+        # (message, sanitized message) pairs reused across LLM calls
+        self.sanitized = []
+        # Names of the tools offered to the LLM; None offers every tool
+        self.tools = None
+        self.messages = list(chat_history or [])
+        # Add the latest query if it's not already in chat history
+        if not self.messages or self.messages[-1]["role"] != "user" or self.messages[-1]["content"] != query:
+            self.messages.append({"role": "user", "content": query})
+
+
 class MCPClient:
     def __init__(self):
-        # Initialize session and client objects
-        self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
-        self.llm = Anthropic()
+        # Initialize session pool and client objects
+        self.pool: Optional[MCPSessionPool] = None
+        self.tool_cache = ToolResultCache()
+        self.journal = ConversationJournal()
+        self.context_budget = ContextBudget()
+        self.usage = LLMUsage()
+        self.llm = AsyncAnthropic()
         self.tools = []
+        self.router = ToolRouter([])
         self.system_prompt = system_prompt
-        self.messages = []  # Initialize messages as an empty list
         self.logger = logger
 
-    # connect to the MCP server
-    async def connect_to_server(self, server_script_path: str):
+    # connect to the MCP servers
+    async def connect_to_server(self, server_script_path: str, pool_size: int = MCP_POOL_SIZE):
         try:
-            is_python = server_script_path.endswith(".py")
-            is_js = server_script_path.endswith(".js")
-            if not (is_python or is_js):
-                raise ValueError("Server script must be a .py or .js file")
-
-            command = "python3" if is_python else "node"
-            server_params = StdioServerParameters(
-                command=command, args=[server_script_path], env=None
-            )
-
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            self.stdio, self.write = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(
-                ClientSession(self.stdio, self.write)
-            )
+            self.pool = MCPSessionPool(server_script_path, pool_size)
+            await self.pool.start()
+            await self.journal.start()
 
-            await self.session.initialize()
-
-            self.logger.info("Connected to MCP server")
+            self.logger.info(f"Connected to {pool_size} MCP servers")
 
             mcp_tools = await self.get_mcp_tools()
             self.tools = [
@@ -88,6 +111,7 @@ class MCPClient:
                 }
                 for tool in mcp_tools
             ]
+            self.router = ToolRouter(self.tools)
 
             self.logger.info(
                 f"Available tools: {[tool['name'] for tool in self.tools]}"
@@ -103,31 +127,52 @@ class MCPClient:
     # get mcp tool list
     async def get_mcp_tools(self):
         try:
-            response = await self.session.list_tools()
+            async with self.pool.lease() as session:
+                response = await session.list_tools()
             return response.tools
         except Exception as e:
             self.logger.error(f"Error getting MCP tools: {e}")
             raise
 
     # process query
-    async def process_query(self, query: str, chat_history: list = []):
+    async def process_query(
+        self, query: str, chat_history: Optional[list] = None, conversation_id: Optional[str] = None
+    ):
         try:
             self.logger.info(f"Processing query: {query}")
-            user_message = {"role": "user", "content": query}
-            
-            # Initialize messages with chat history if provided, otherwise start fresh
-            if chat_history and len(chat_history) > 0:
-                self.messages = chat_history
-                # Add the latest query if it's not already in chat history
-                if self.messages[-1]["role"] != "user" or self.messages[-1]["content"] != query:
-                    self.messages.append({"role": "user", "content": query})
-            else:
-                self.messages = [
-                    {"role": "user", "content": query},
-                ]
+            if self.journal.known(conversation_id):
+                if chat_history:
+                    # Journal lines are indexed by position in the journaled history
+                    raise ValueError(f"Conversation {conversation_id} is journaled; send its id without chat_history")
+                # Continue a journaled conversation
+                chat_history = await self.journal.load(conversation_id)
+            conversation = Conversation(query, chat_history, conversation_id)
+            messages = conversation.messages
+            if TOOL_ROUTING:
+                conversation.tools = self.router.select(query, messages)
+                self.logger.info(f"Routed {len(conversation.tools)}/{len(self.tools)} tools: {sorted(conversation.tools)}")
 
             while True:
-                response = await self.call_llm()
+                turn_started = time.perf_counter()
+                semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+                started_tools = {}
+
+                def start_tool(tool_use):
+                    # Run each tool as soon as its block has streamed in
+                    started_tools[tool_use.id] = asyncio.create_task(
+                        self.call_tool(tool_use, semaphore, conversation)
+                    )
+
+                try:
+                    response = await self.call_llm(conversation, on_tool_use=start_tool)
+                except BaseException:
+                    for task in started_tools.values():
+                        task.cancel()
+                    raise
+                self.logger.info(
+                    f"LLM turn took {time.perf_counter() - turn_started:.2f}s, "
+                    f"{len(started_tools)} tools started while streaming"
+                )
 
                 # the response is a text message
                 if response.content[0].type == "text" and len(response.content) == 1:
@@ -135,8 +180,8 @@ class MCPClient:
                         "role": "assistant",
                         "content": response.content[0].text,
                     }
-                    self.messages.append(assistant_message)
-                    await self.log_conversation()
+                    messages.append(assistant_message)
+                    await self.log_conversation(conversation)
                     break
 
                 # the response is a tool call
@@ -144,111 +189,227 @@ class MCPClient:
                     "role": "assistant",
                     "content": response.to_dict()["content"],
                 }
-                self.messages.append(assistant_message)
-                await self.log_conversation()
-
-                for content in response.content:
-                    if content.type == "tool_use":
-                        tool_name = content.name
-                        tool_args = content.input
-                        tool_use_id = content.id
-                        self.logger.info(
-                            f"Calling tool {tool_name} with args {tool_args}"
-                        )
-                        try:
-                            result = await self.session.call_tool(tool_name, tool_args)
-                            self.logger.info(f"Tool {tool_name} result: {result}...")
-                            self.messages.append(
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {
-                                            "type": "tool_result",
-                                            "tool_use_id": tool_use_id,
-                                            "content": result.content,
-                                        }
-                                    ],
-                                }
-                            )
-                            await self.log_conversation()
-                        except Exception as e:
-                            self.logger.error(f"Error calling tool {tool_name}: {e}")
-                            raise
-
-            return self.messages
+                messages.append(assistant_message)
+                await self.log_conversation(conversation)
+
+                tool_uses = [content for content in response.content if content.type == "tool_use"]
+                if not tool_uses:
+                    break
+                tool_results = await self.call_tools(tool_uses, started_tools, semaphore, conversation)
+                # Every result of the turn goes back in a single user message
+                messages.append({"role": "user", "content": tool_results})
+                await self.log_conversation(conversation)
+
+            if conversation.context.tokens_saved:
+                self.logger.info(
+                    f"Context budget saved ~{conversation.context.tokens_saved} tokens "
+                    f"over {conversation.context.calls} LLM calls"
+                )
+            return messages
 
         except Exception as e:
             self.logger.error(f"Error processing query: {e}")
             raise
 
+    def route_tool_use(self, tool_use, conversation):
+        """Widen the conversation's tool subset for a tool_use; returns a tool_result when handled locally."""
+        if conversation is None or conversation.tools is None:
+            return None
+        if tool_use.name == REQUEST_TOOLS_NAME:
+            added = self.router.expand(conversation.tools, tool_use.input.get("need", ""))
+            self.logger.info(f"Model requested more tools, added {added}")
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "content": f"These tools are now available: {', '.join(added) or 'none, all tools are offered'}",
+            }
+        if self.router.add(conversation.tools, tool_use.name):
+            self.logger.info(f"Model called {tool_use.name} outside its routed tools, added it")
+        elif tool_use.name not in self.router.terms:
+            # An unknown name still says what the model was looking for
+            added = self.router.expand(conversation.tools, tool_use.name)
+            self.logger.info(f"Model called unknown tool {tool_use.name}, added {added}")
+        return None
+
+    async def call_tool(self, tool_use, semaphore, conversation=None):
+        """Run one tool_use block and shape its outcome as a tool_result block."""
+        timeout = TOOL_TIMEOUTS.get(tool_use.name, TOOL_TIMEOUT)
+        routed = self.route_tool_use(tool_use, conversation)
+        if routed is not None:
+            return routed, 0.0
+        async with semaphore:
+            started = time.perf_counter()
+            self.logger.info(f"Calling tool {tool_use.name} with args {tool_use.input}")
+            try:
+                result = self.tool_cache.get(tool_use.name, tool_use.input)
+                if result is not None:
+                    self.logger.info(f"Tool {tool_use.name} served from cache")
+                else:
+                    async with self.pool.lease() as session:
+                        result = await asyncio.wait_for(session.call_tool(tool_use.name, tool_use.input), timeout)
+                    self.tool_cache.put(tool_use.name, tool_use.input, result)
+                self.logger.info(f"Tool {tool_use.name} result: {result}...")
+                tool_result = {
+                    "type": "tool_result",
+                    "tool_use_id": tool_use.id,
+                    "content": result.content,
+                }
+            except asyncio.TimeoutError:
+                self.logger.error(f"Tool {tool_use.name} timed out after {timeout}s")
+                tool_result = {
+                    "type": "tool_result",
+                    "tool_use_id": tool_use.id,
+                    "content": f"Tool {tool_use.name} timed out after {timeout}s",
+                    "is_error": True,
+                }
+            except Exception as e:
+                self.logger.error(f"Error calling tool {tool_use.name}: {e}")
+                tool_result = {
+                    "type": "tool_result",
+                    "tool_use_id": tool_use.id,
+                    "content": f"Error calling tool {tool_use.name}: {e}",
+                    "is_error": True,
+                }
+            return tool_result, time.perf_counter() - started
+
+    async def call_tools(self, tool_uses, started=None, semaphore=None, conversation=None):
+        """Run a turn's tool_use blocks concurrently; results keep the block order.
+
+        `started` maps tool_use ids to calls already running (started while
+        the response streamed in); the other blocks are started here.
+        """
+        started_at = time.perf_counter()
+        started = started or {}
+        semaphore = semaphore or asyncio.Semaphore(TOOL_CONCURRENCY)
+        outcomes = await asyncio.gather(*(
+            started.get(tool_use.id) or self.call_tool(tool_use, semaphore, conversation) for tool_use in tool_uses
+        ))
+        timings = ", ".join(
+            f"{tool_use.name}={elapsed:.2f}s" for tool_use, (_, elapsed) in zip(tool_uses, outcomes)
+        )
+        self.logger.info(
+            f"Ran {len(tool_uses)} tools in {time.perf_counter() - started_at:.2f}s "
+            f"(sequential {sum(elapsed for _, elapsed in outcomes):.2f}s): {timings}"
+        )
+        return [tool_result for tool_result, _ in outcomes]
+
     # call llm
-    def sanitize_messages(self, messages):
-        """Sanitize messages to ensure compatibility with Anthropic API"""
-        sanitized_messages = []
-        
-        for message in messages:
-            sanitized_message = {"role": message["role"]}
-            
-            # Handle different content types
-            if isinstance(message["content"], str):
-                sanitized_message["content"] = message["content"]
-            elif isinstance(message["content"], list):
-                sanitized_content = []
-                
-                for item in message["content"]:
-                    if isinstance(item, dict):
-                        # Handle tool results
-                        if item.get("type") == "tool_result":
-                            sanitized_item = {"type": "tool_result", "tool_use_id": item.get("tool_use_id")}
-                            
-                            # Sanitize the content of the tool result
-                            if "content" in item:
-                                if isinstance(item["content"], list):
-                                    sanitized_content_list = []
-                                    for content_item in item["content"]:
-                                        if isinstance(content_item, dict) and "text" in content_item:
-                                            # Remove annotations
-                                            text_content = {"type": "text", "text": content_item["text"]}
-                                            if "annotations" in text_content:
-                                                del text_content["annotations"]
-                                            sanitized_content_list.append(text_content)
-                                        else:
-                                            sanitized_content_list.append(content_item)
-                                    sanitized_item["content"] = sanitized_content_list
-                                else:
-                                    sanitized_item["content"] = item["content"]
-                            
-                            sanitized_content.append(sanitized_item)
-                        else:
-                            # For other types of dict content
-                            sanitized_content.append(item)
+    def sanitize_message(self, message):
+        """Sanitize one message to ensure compatibility with Anthropic API"""
+        sanitized_message = {"role": message["role"]}
+
+        # Handle different content types
+        if isinstance(message["content"], str):
+            sanitized_message["content"] = message["content"]
+        elif isinstance(message["content"], list):
+            sanitized_content = []
+
+            for item in message["content"]:
+                if isinstance(item, dict):
+                    # Handle tool results
+                    if item.get("type") == "tool_result":
+                        sanitized_item = {"type": "tool_result", "tool_use_id": item.get("tool_use_id")}
+
+                        # Sanitize the content of the tool result
+                        if "content" in item:
+                            if isinstance(item["content"], list):
+                                sanitized_content_list = []
+                                for content_item in item["content"]:
+                                    if isinstance(content_item, dict) and "text" in content_item:
+                                        # Keep only type and text, dropping annotations
+                                        sanitized_content_list.append({"type": "text", "text": content_item["text"]})
+                                    else:
+                                        sanitized_content_list.append(content_item)
+                                sanitized_item["content"] = sanitized_content_list
+                            else:
+                                sanitized_item["content"] = item["content"]
+
+                        sanitized_content.append(sanitized_item)
                     else:
-                        # For non-dict content
+                        # For other types of dict content
                         sanitized_content.append(item)
-                
-                sanitized_message["content"] = sanitized_content
-            else:
-                # For other types of content (shouldn't happen, but just in case)
-                sanitized_message["content"] = str(message["content"])
-            
-            sanitized_messages.append(sanitized_message)
-        
-        return sanitized_messages
-
-    async def call_llm(self):
+                else:
+                    # For non-dict content
+                    sanitized_content.append(item)
+
+            sanitized_message["content"] = sanitized_content
+        else:
+            # For other types of content (shouldn't happen, but just in case)
+            sanitized_message["content"] = str(message["content"])
+
+        return sanitized_message
+
+    def sanitize_messages(self, messages, cache=None):
+        """Sanitize messages to ensure compatibility with Anthropic API.
+
+        With a `cache` list (one per conversation), messages sanitized on an
+        earlier call are reused as long as the same message object is still
+        at that index, so each turn only sanitizes the newly appended ones.
+        """
+        if cache is None:
+            return [self.sanitize_message(message) for message in messages]
+
+        reused = 0
+        while reused < min(len(cache), len(messages)) and cache[reused][0] is messages[reused]:
+            reused += 1
+        del cache[reused:]
+        for message in messages[reused:]:
+            cache.append((message, self.sanitize_message(message)))
+        return [sanitized for _, sanitized in cache]
+
+    async def call_llm(self, conversation: Conversation, on_tool_use=None):
+        """Get the next assistant message.
+
+        With streaming on, `on_tool_use(block)` is called for every tool_use
+        block as soon as it is complete, before the rest of the message.
+        """
         try:
             self.logger.info("Calling LLM")
             
             # Sanitize messages before sending to LLM
-            sanitized_messages = self.sanitize_messages(self.messages)
-            
-            return self.llm.messages.create(
-                model="claude-3-5-sonnet-latest",
+            sanitized_messages = self.sanitize_messages(conversation.messages, conversation.sanitized)
+            # Compact old tool results once the history passes the token budget
+            sanitized_messages, report = self.context_budget.fit(sanitized_messages, conversation.context)
+            if report["compacted_messages"]:
+                self.logger.info(
+                    f"Context ~{report['tokens_before']} -> ~{report['tokens_after']} tokens, "
+                    f"compacted {report['compacted_messages']} messages"
+                )
+            tools = self.tools if conversation.tools is None else self.router.tools_for(conversation.tools)
+            request = dict(
+                model=LLM_MODEL,
                 system=self.system_prompt,  # Pass system prompt here
                 messages=sanitized_messages,
-                tools=self.tools,
-                max_tokens=1000,
+                tools=tools,
+                max_tokens=LLM_MAX_TOKENS,
             )
+            if PROMPT_CACHING:
+                # Tools, system prompt and earlier turns are identical between calls
+                request.update(
+                    system=cache_system(self.system_prompt),
+                    tools=cache_tools(tools),
+                    messages=cache_messages(sanitized_messages),
+                )
+            if not LLM_STREAMING:
+                response = await self.llm.messages.create(**request)
+            else:
+                async with self.llm.messages.stream(**request) as stream:
+                    async for event in stream:
+                        if (
+                            on_tool_use
+                            and event.type == "content_block_stop"
+                            and event.content_block.type == "tool_use"
+                        ):
+                            on_tool_use(event.content_block)
+                    response = await stream.get_final_message()
+
+            usage = response.usage
+            self.usage.record(usage)
+            self.logger.info(
+                f"LLM usage: input={usage.input_tokens} output={usage.output_tokens} "
+                f"cache_read={usage.cache_read_input_tokens or 0} cache_write={usage.cache_creation_input_tokens or 0}"
+            )
+            return response
         except Exception as e:
             self.logger.error(f"Error calling LLM: {e}")
             raise
@@ -256,53 +417,19 @@ class MCPClient:
     # cleanup
     async def cleanup(self):
         try:
-            await self.exit_stack.aclose()
-            self.logger.info("Disconnected from MCP server")
+            await self.journal.stop()
+            if self.pool:
+                await self.pool.close()
+            self.logger.info("Disconnected from MCP servers")
         except Exception as e:
             self.logger.error(f"Error during cleanup: {e}")
             traceback.print_exc()
             raise
 
-    async def log_conversation(self):
-        os.makedirs("conversations", exist_ok=True)
-
-        serializable_conversation = []
-
-        for message in self.messages:
-            try:
-                serializable_message = {"role": message["role"], "content": []}
-
-                # Handle both string and list content
-                if isinstance(message["content"], str):
-                    serializable_message["content"] = message["content"]
-                elif isinstance(message["content"], list):
-                    for content_item in message["content"]:
-                        if hasattr(content_item, "to_dict"):
-                            serializable_message["content"].append(
-                                content_item.to_dict()
-                            )
-                        elif hasattr(content_item, "dict"):
-                            serializable_message["content"].append(content_item.dict())
-                        elif hasattr(content_item, "model_dump"):
-                            serializable_message["content"].append(
-                                content_item.model_dump()
-                            )
-                        else:
-                            serializable_message["content"].append(content_item)
-
-                serializable_conversation.append(serializable_message)
-            except Exception as e:
-                self.logger.error(f"Error processing message: {str(e)}")
-                self.logger.debug(f"Message content: {message}")
-                raise
-
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filepath = os.path.join("conversations", f"conversation_{timestamp}.json")
-
+    async def log_conversation(self, conversation: Conversation):
+        """Append the conversation's new messages to the journal (buffered)."""
         try:
-            with open(filepath, "w") as f:
-                json.dump(serializable_conversation, f, indent=2, default=str)
+            self.journal.record(conversation.id, conversation.messages)
         except Exception as e:
-            self.logger.error(f"Error writing conversation to file: {str(e)}")
-            self.logger.debug(f"Serializable conversation: {serializable_conversation}")
+            self.logger.error(f"Error journaling conversation {conversation.id}: {str(e)}")
             raise
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from utils.logger import logger
+
+# Every pooled server is its own process with its own market streams and
+# browser pool; the Binance weight budget is split between them
+MCP_POOL_SIZE = int(os.environ.get("MCP_POOL_SIZE", "1"))
+# Calls one server session runs at the same time (the server handles
+# requests concurrently); more wait for a free slot on any session
+MCP_SESSION_MAX_CALLS = int(os.environ.get("MCP_SESSION_MAX_CALLS", "16"))
+# Ping a session before leasing it when it sat idle this long (seconds)
+MCP_HEALTH_CHECK_IDLE = float(os.environ.get("MCP_HEALTH_CHECK_IDLE", "30"))
+MCP_HEALTH_CHECK_TIMEOUT = float(os.environ.get("MCP_HEALTH_CHECK_TIMEOUT", "5"))
+MCP_START_TIMEOUT = float(os.environ.get("MCP_START_TIMEOUT", "60"))
+
+
+def server_parameters(server_script_path, processes=1):
+    is_python = server_script_path.endswith(".py")
+    is_js = server_script_path.endswith(".js")
+    if not (is_python or is_js):
+        raise ValueError("Server script must be a .py or .js file")
+    command = "python3" if is_python else "node"
+    # Tell each server how many processes share the IP's Binance rate limits
+    env = {**os.environ, "BINANCE_RATE_LIMIT_PROCESSES": str(processes)}
+    return StdioServerParameters(command=command, args=[server_script_path], env=env)
+
+
+class MCPServerConnection:
+    """One MCP server subprocess and its client session.
+
+    The stdio transport is opened and closed inside a task owned by the
+    connection, because its cancel scopes must be exited by the task that
+    entered them; `restart` asks that task to reconnect.
+    """
+
+    def __init__(self, params, index):
+        self.params = params
+        self.index = index
+        self.session = None
+        self.last_used = time.monotonic()
+        self.restarts = 0
+        self.calls = 0
+        self.in_flight = 0
+        self.check_lock = asyncio.Lock()
+        self._ready = asyncio.Event()
+        self._reconnect = asyncio.Event()
+        self._closing = False
+        self._task = None
+        self._error = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        await self.wait_ready()
+
+    async def wait_ready(self):
+        await asyncio.wait_for(self._ready.wait(), MCP_START_TIMEOUT)
+        if self.session is None:
+            raise RuntimeError(f"MCP server {self.index} failed to start: {self._error}")
+
+    async def _run(self):
+        backoff = 1
+        while not self._closing:
+            failed = False
+            try:
+                async with stdio_client(self.params) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        self.session = session
+                        self.last_used = time.monotonic()
+                        self._ready.set()
+                        backoff = 1
+                        logger.info(f"MCP server {self.index} connected")
+                        await self._reconnect.wait()
+            except Exception as e:
+                if self._reconnect.is_set():
+                    # Tearing down a dead server on restart, not a failed start
+                    logger.warning(f"MCP server {self.index} closed with an error: {e}")
+                else:
+                    failed = True
+                    self._error = e
+                    logger.error(f"MCP server {self.index} connection failed: {e}")
+            finally:
+                self.session = None
+                self._reconnect.clear()
+            if self._closing:
+                break
+            if failed:
+                # Wake waiters so they see the failure instead of timing out
+                self._ready.set()
+                self._ready.clear()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+        self._ready.set()
+
+    async def restart(self):
+        self.restarts += 1
+        self._ready.clear()
+        self._reconnect.set()
+        await self.wait_ready()
+
+    async def healthy(self):
+        if self.session is None:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), MCP_HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self._closing = True
+        self._reconnect.set()
+        if self._task:
+            await self._task
+
+
+class MCPSessionPool:
+    """Pool of MCP server subprocesses shared by concurrent calls.
+
+    A lease goes to the session with the fewest calls in flight, and each
+    session carries up to `max_calls` at once. Sessions idle for longer
+    than MCP_HEALTH_CHECK_IDLE are pinged before being handed out, and
+    restarted when the ping fails. A session whose lease ended in an error
+    is checked on its next lease.
+    """
+
+    def __init__(self, server_script_path, size=MCP_POOL_SIZE, max_calls=MCP_SESSION_MAX_CALLS):
+        self.params = server_parameters(server_script_path, size)
+        self.size = size
+        self.max_calls = max_calls
+        self.connections = []
+        self._slots = asyncio.Condition()
+        self._suspect = set()
+        self.leases = 0
+        self.waits = 0
+
+    async def start(self):
+        self.connections = [MCPServerConnection(self.params, i) for i in range(self.size)]
+        await asyncio.gather(*(connection.start() for connection in self.connections))
+        logger.info(f"MCP session pool started with {self.size} servers")
+
+    async def _checked(self, connection):
+        # One check at a time per server, so concurrent leases restart it once
+        async with connection.check_lock:
+            idle = time.monotonic() - connection.last_used
+            if connection.index in self._suspect or idle > MCP_HEALTH_CHECK_IDLE:
+                if not await connection.healthy():
+                    logger.warning(f"MCP server {connection.index} failed its health check, restarting it")
+                    await connection.restart()
+                self._suspect.discard(connection.index)
+                connection.last_used = time.monotonic()
+        return connection
+
+    async def _acquire(self):
+        async with self._slots:
+            if all(connection.in_flight >= self.max_calls for connection in self.connections):
+                self.waits += 1
+            while True:
+                connection = min(self.connections, key=lambda connection: connection.in_flight)
+                if connection.in_flight < self.max_calls:
+                    connection.in_flight += 1
+                    return connection
+                await self._slots.wait()
+
+    async def _release(self, connection):
+        async with self._slots:
+            connection.in_flight -= 1
+            self._slots.notify()
+
+    @asynccontextmanager
+    async def lease(self):
+        connection = await self._acquire()
+        try:
+            connection = await self._checked(connection)
+            self.leases += 1
+            connection.calls += 1
+            yield connection.session
+        except Exception:
+            self._suspect.add(connection.index)
+            raise
+        finally:
+            connection.last_used = time.monotonic()
+            await asyncio.shield(self._release(connection))
+
+    async def close(self):
+        await asyncio.gather(*(connection.close() for connection in self.connections), return_exceptions=True)
+        self.connections = []
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "max_calls": self.max_calls,
+            "in_flight": sum(connection.in_flight for connection in self.connections),
+            "leases": self.leases,
+            "waits": self.waits,
+            "servers": [
+                {
+                    "index": connection.index,
+                    "connected": connection.session is not None,
+                    "calls": connection.calls,
+                    "in_flight": connection.in_flight,
+                    "restarts": connection.restarts,
+                }
+                for connection in self.connections
+            ],
+        }
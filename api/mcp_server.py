@@ -1,14 +1,22 @@
 from mcp.server.fastmcp import FastMCP
+from contextlib import asynccontextmanager
+import asyncio
 import json
+import os
 import re
 from typing import Optional, List, Dict, Any
 from apis import (
     exchange_info_of_a_symbol,
     exchange_info_of_all_symbols,
+    find_symbols,
     get_trade_data,
+    get_trade_data_range,
+    technical_indicators,
+    multi_timeframe,
     agg_trades,
     trade_history,
     depth,
+    cumulative_depth,
     current_avg_price,
     price_ticker_in_24hr,
     trading_day_ticker,
@@ -17,10 +25,90 @@ from apis import (
     put_order,
     rolling_window_ticker,
 )
-from screen_shot import take_screenshot
+from screen_shot import SCREENSHOT_MODE, screenshot_cache, take_native_screenshot, take_screenshot
+import http_client
+from exchange_info import exchange_info_store
+from rate_limiter import rate_limiter
+from single_flight import single_flight
+from market_stream import market_stream
+from order_book import ORDER_BOOK_ENABLED, order_books
+from browser_pool import browser_pool
+from capture_executor import capture_executor
+from image_pipeline import image_pipeline
 
+# Launch the capture browsers at startup instead of on the first screenshot
+BROWSER_POOL_PREWARM = os.environ.get("BROWSER_POOL_PREWARM", "false").lower() in ("1", "true", "yes")
 
-mcp = FastMCP("TradeAssistant", "0.1.0")
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Open shared resources when the server starts and release them on shutdown."""
+    async with http_client.lifespan():
+        await exchange_info_store.start()
+        if ORDER_BOOK_ENABLED:
+            order_books.attach(market_stream)
+        await market_stream.start()
+        if BROWSER_POOL_PREWARM and SCREENSHOT_MODE == "tradingview":
+            await asyncio.to_thread(browser_pool.start)
+        await capture_executor.start()
+        try:
+            yield
+        finally:
+            await capture_executor.stop()
+            await asyncio.to_thread(browser_pool.close)
+            await market_stream.stop()
+            await exchange_info_store.stop()
+
+
+mcp = FastMCP("TradeAssistant", "0.1.0", lifespan=lifespan)
+
+
+@mcp.resource("metrics://rate-limit")
+def rate_limit_metrics() -> str:
+    """Current Binance request weight and order budget."""
+    return json.dumps(rate_limiter.snapshot())
+
+
+@mcp.resource("metrics://single-flight")
+def single_flight_metrics() -> str:
+    """Hit/miss counters of the in-flight request coalescing."""
+    return json.dumps(single_flight.stats())
+
+
+@mcp.resource("metrics://market-stream")
+def market_stream_metrics() -> str:
+    """Connection state and message counters of the live market stream."""
+    return json.dumps(market_stream.stats())
+
+
+@mcp.resource("metrics://order-books")
+def order_book_metrics() -> str:
+    """Sync state of the locally maintained order books."""
+    return json.dumps(order_books.stats())
+
+
+@mcp.resource("metrics://browser-pool")
+def browser_pool_metrics() -> str:
+    """Lease and restart counters of the chart capture browsers."""
+    return json.dumps(browser_pool.stats())
+
+
+@mcp.resource("metrics://screenshot-cache")
+def screenshot_cache_metrics() -> str:
+    """Hit rate and upload dedup counters of the chart screenshot cache."""
+    return json.dumps(screenshot_cache.stats())
+
+
+@mcp.resource("metrics://capture-executor")
+def capture_executor_metrics() -> str:
+    """Queue depth and job outcomes of the background chart capture workers."""
+    return json.dumps(capture_executor.stats())
+
+
+@mcp.resource("metrics://image-pipeline")
+def image_pipeline_metrics() -> str:
+    """Bytes saved by optimizing chart images before upload."""
+    return json.dumps(image_pipeline.stats())
 
 
 @mcp.tool()
@@ -47,7 +135,28 @@ async def bb7_ExchangeInfoOfAllSymbole():
         Exchange information for all symbols
     """
     data = await exchange_info_of_all_symbols()
-    return json.dumps(data)
+    return data
+
+
+@mcp.tool()
+async def bb7_FindSymbols(
+    baseAsset: Optional[str] = None,
+    quoteAsset: Optional[str] = None,
+    status: Optional[str] = None,
+):
+    """
+    Find trading symbols by base asset, quote asset and/or status.
+
+    Args:
+        baseAsset: Optional base asset (e.g. "BTC")
+        quoteAsset: Optional quote asset (e.g. "USDT")
+        status: Optional trading status (e.g. "TRADING")
+
+    Returns:
+        List of symbols matching every given filter
+    """
+    data = await find_symbols(baseAsset, quoteAsset, status)
+    return data
 
 
 @mcp.tool()
@@ -82,6 +191,94 @@ async def bb7_getTradeData(
         return json.dumps({"error": error_message})
 
 
+@mcp.tool()
+async def bb7_getTradeDataRange(
+    symbol: str,
+    interval: str,
+    startTime: int,
+    endTime: Optional[int] = None,
+):
+    """
+    Get all kline/candlestick data for a symbol between two times, beyond the
+    1000 candle limit of bb7_getTradeData.
+
+    Args:
+        symbol: The symbol to get klines for (e.g. "BTCUSDT")
+        interval: The interval for the kline data (e.g. "1m", "1h", "1d")
+        startTime: Start time in milliseconds
+        endTime: Optional end time in milliseconds, defaults to now
+
+    Returns:
+        Compact klines as {"columns": [...], "rows": [[...], ...]} ordered by open time
+    """
+    try:
+        data = await get_trade_data_range(symbol, interval, start_time=startTime, end_time=endTime)
+        return data
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+async def bb7_MultiTimeframe(
+    symbol: str,
+    timeframes: List[str],
+    baseInterval: Optional[str] = None,
+    limit: int = 100,
+):
+    """
+    Get klines for several timeframes at once (multi-timeframe analysis).
+
+    Timeframes are aggregated locally from as few Binance intervals as
+    possible (e.g. 1h for 1h and 4h, 1d for 1d, 1w and 1M), which also
+    allows timeframes Binance does not serve such as "2d" or "45m"; weeks
+    start Monday 00:00 UTC. Use this instead of calling bb7_getTradeData
+    once per timeframe.
+
+    Args:
+        symbol: The symbol to get klines for (e.g. "BTCUSDT")
+        timeframes: Timeframes to return (e.g. ["15m", "4h", "1d", "1w", "1M"])
+        baseInterval: Optional interval to aggregate every timeframe from
+        limit: Number of most recent candles per timeframe
+
+    Returns:
+        Compact klines per timeframe as {"columns": [...], "baseIntervals": {...}, "timeframes": {"1h": [[...], ...], ...}}
+    """
+    try:
+        data = await multi_timeframe(symbol, timeframes, baseInterval, limit)
+        return data
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+async def bb7_TechnicalIndicators(
+    symbols: List[str],
+    intervals: List[str],
+    limit: int = 500,
+):
+    """
+    Get technical indicator summaries computed from the latest klines.
+
+    For every symbol and interval returns trend, SMA/EMA 20 and 50, RSI(14),
+    MACD(12, 26, 9), Bollinger bands(20, 2), ATR(14), VWAP, floor pivots
+    from the last closed candle, nearest swing support/resistance levels
+    and the volume profile (point of control and value area).
+
+    Args:
+        symbols: Symbols to analyse (e.g. ["BTCUSDT", "ETHUSDT"])
+        intervals: Kline intervals to analyse (e.g. ["1h", "4h", "1d"])
+        limit: Number of candles per series to compute over (max 1000)
+
+    Returns:
+        Indicator summaries keyed by symbol and interval
+    """
+    try:
+        data = await technical_indicators(symbols, intervals, min(limit, 1000))
+        return data
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
 @mcp.tool()
 async def bb7_AggTrades(symbol: str):
     """
@@ -113,17 +310,34 @@ async def bb7_TradeHistory(symbol: str):
 
 
 @mcp.tool()
-async def bb7_Depth(symbol: str):
+async def bb7_Depth(symbol: str, limit: Optional[int] = None):
     """
     Get order book depth for a symbol.
 
     Args:
         symbol: The symbol to get depth for (e.g. "BTCUSDT")
+        limit: Optional number of levels per side (default 100, max 5000)
 
     Returns:
         Order book depth for the specified symbol
     """
-    data = await depth(symbol)
+    data = await depth(symbol, limit)
+    return data
+
+
+@mcp.tool()
+async def bb7_CumulativeDepth(symbol: str, percent: float = 1.0):
+    """
+    Get the bid and ask liquidity within a percentage of the mid price.
+
+    Args:
+        symbol: The symbol to get liquidity for (e.g. "BTCUSDT")
+        percent: Distance from the mid price in percent (e.g. 1.0)
+
+    Returns:
+        Mid price, spread, bid/ask quantity and notional, and book imbalance
+    """
+    data = await cumulative_depth(symbol, percent)
     return data
 
 
@@ -232,7 +446,7 @@ async def bb7_RollingWindowTicker(
 
 
 @mcp.tool()
-async def takeScreenShotOfTarde(chart_url):
+async def takeScreenShotOfTarde(chart_url, mode: Optional[str] = None):
     """
     Take a screenshot of the chart.
     https://www.tradingview.com/chart/YiBYLtYW/?symbol=CRYPTO%3A{symbol}
@@ -244,11 +458,15 @@ async def takeScreenShotOfTarde(chart_url):
 
     Args:
         chart_url: URL of the chart to take a screenshot of
+        mode: Optional "tradingview" (browser capture) or "native" (charts
+            rendered from Binance klines with EMA and Bollinger overlays, much faster)
 
     Returns:
          Array of Screenshot URL of the chart
     """
-    return take_screenshot(chart_url)
+    if (mode or SCREENSHOT_MODE) == "native":
+        return await take_native_screenshot(chart_url)
+    return await capture_executor.run(take_screenshot, chart_url)
 
 @mcp.tool()
 async def bb7_PutOrder(
@@ -267,4 +485,5 @@ async def bb7_PutOrder(
     data = await put_order(symbol, side, type_, time_in_force, quantity, price)
     return data
 
-mcp.run(transport="stdio")
+if __name__ == "__main__":
+    mcp.run(transport="stdio")
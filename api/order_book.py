@@ -0,0 +1,220 @@
+import asyncio
+import os
+from bisect import bisect_left, bisect_right
+
+from utils.logger import logger
+from utils.fastjson import loads
+from http_client import request
+
+ORDER_BOOK_ENABLED = os.environ.get("ORDER_BOOK_ENABLED", "true").lower() in ("1", "true", "yes")
+# Levels requested for the REST snapshot that seeds each book (weight 50 up to 1000)
+ORDER_BOOK_SNAPSHOT_LIMIT = int(os.environ.get("ORDER_BOOK_SNAPSHOT_LIMIT", "1000"))
+DEPTH_STREAM = "depth@100ms"
+
+
+class BookSide:
+    """Price levels of one side, kept sorted best-first in parallel arrays.
+
+    `keys` holds the float price (negated for bids so both sides sort
+    ascending) and is binary-searched; `levels` holds the original
+    [price, quantity] strings so responses match the REST format exactly.
+    """
+
+    def __init__(self, descending):
+        self.sign = -1 if descending else 1
+        self.keys = []
+        self.levels = []
+
+    def set(self, price, quantity):
+        key = self.sign * float(price)
+        i = bisect_left(self.keys, key)
+        exists = i < len(self.keys) and self.keys[i] == key
+        if float(quantity) == 0:
+            if exists:
+                del self.keys[i]
+                del self.levels[i]
+        elif exists:
+            self.levels[i] = [price, quantity]
+        else:
+            self.keys.insert(i, key)
+            self.levels.insert(i, [price, quantity])
+
+    def top(self, n):
+        return self.levels[:n]
+
+    def best(self):
+        return float(self.levels[0][0]) if self.levels else None
+
+    def cumulative(self, bound):
+        """Total quantity and notional of the levels at or better than `bound`."""
+        end = bisect_right(self.keys, self.sign * bound)
+        quantity = notional = 0.0
+        for price, qty in self.levels[:end]:
+            quantity += float(qty)
+            notional += float(price) * float(qty)
+        return quantity, notional
+
+    def clear(self):
+        self.keys.clear()
+        self.levels.clear()
+
+
+class OrderBook:
+    """Full-depth order book for one symbol, seeded from a snapshot and kept
+    current from the diff-depth stream."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = None
+        self.synced = False
+        self.buffer = []
+
+    def reset(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self.synced = False
+        self.buffer = []
+
+    def load_snapshot(self, snapshot):
+        self.bids.clear()
+        self.asks.clear()
+        for price, quantity in snapshot["bids"]:
+            self.bids.set(price, quantity)
+        for price, quantity in snapshot["asks"]:
+            self.asks.set(price, quantity)
+        self.last_update_id = snapshot["lastUpdateId"]
+
+    def apply(self, event):
+        """Apply a depthUpdate event; returns False if an update was missed."""
+        if event["u"] <= self.last_update_id:
+            return True
+        if event["U"] > self.last_update_id + 1:
+            return False
+        for price, quantity in event["b"]:
+            self.bids.set(price, quantity)
+        for price, quantity in event["a"]:
+            self.asks.set(price, quantity)
+        self.last_update_id = event["u"]
+        return True
+
+    def snapshot(self, limit=100):
+        """The book in the GET /depth response shape."""
+        return {
+            "lastUpdateId": self.last_update_id,
+            "bids": self.bids.top(limit),
+            "asks": self.asks.top(limit),
+        }
+
+    def cumulative_depth(self, percent):
+        """Quantity and notional within `percent` of the mid price on each side."""
+        best_bid, best_ask = self.bids.best(), self.asks.best()
+        if best_bid is None or best_ask is None:
+            return None
+        mid = (best_bid + best_ask) / 2
+        bid_qty, bid_notional = self.bids.cumulative(mid * (1 - percent / 100))
+        ask_qty, ask_notional = self.asks.cumulative(mid * (1 + percent / 100))
+        return {
+            "symbol": self.symbol,
+            "midPrice": mid,
+            "spread": best_ask - best_bid,
+            "percent": percent,
+            "bidQty": bid_qty,
+            "bidNotional": bid_notional,
+            "askQty": ask_qty,
+            "askNotional": ask_notional,
+            "imbalance": (bid_notional - ask_notional) / (bid_notional + ask_notional)
+            if bid_notional + ask_notional else 0.0,
+        }
+
+
+async def fetch_snapshot(symbol, limit=ORDER_BOOK_SNAPSHOT_LIMIT):
+    response = await request("GET", "depth", params={"symbol": symbol, "limit": limit})
+    response.raise_for_status()
+    return loads(response.content)
+
+
+class OrderBookManager:
+    """Keeps an OrderBook per watched symbol in sync with the depth stream.
+
+    Follows the Binance procedure for a local book: buffer stream events,
+    fetch a snapshot, drop events it already contains, then require every
+    event to continue exactly where the previous one ended. A gap or a
+    reconnect discards the book and starts over.
+    """
+
+    def __init__(self, snapshot_limit=ORDER_BOOK_SNAPSHOT_LIMIT):
+        self.snapshot_limit = snapshot_limit
+        self.books = {}
+        self.resyncs = 0
+        self._stream = None
+        self._sync_tasks = {}
+
+    def attach(self, stream):
+        """Feed this manager from the depth stream of a MarketStream."""
+        self._stream = stream
+        stream.add_handler(DEPTH_STREAM, self.handle, on_reconnect=self.reset)
+
+    def reset(self):
+        for book in self.books.values():
+            book.reset()
+
+    def handle(self, event):
+        symbol = event["s"]
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol)
+        if book.synced:
+            if not book.apply(event):
+                logger.warning(f"Order book gap for {symbol}, resyncing")
+                self.resyncs += 1
+                book.reset()
+                book.buffer.append(event)
+                self._schedule_sync(book)
+            return
+        book.buffer.append(event)
+        self._schedule_sync(book)
+
+    def _schedule_sync(self, book):
+        task = self._sync_tasks.get(book.symbol)
+        if task is None or task.done():
+            self._sync_tasks[book.symbol] = asyncio.create_task(self._sync(book))
+
+    async def _sync(self, book):
+        while not book.synced:
+            try:
+                snapshot = await fetch_snapshot(book.symbol, self.snapshot_limit)
+            except Exception as e:
+                logger.error(f"Order book snapshot for {book.symbol} failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not book.buffer or snapshot["lastUpdateId"] < book.buffer[0]["U"]:
+                # The snapshot is older than the first buffered event; wait for more
+                await asyncio.sleep(0.5)
+                continue
+            book.load_snapshot(snapshot)
+            pending = [e for e in book.buffer if e["u"] > book.last_update_id]
+            book.buffer = []
+            if all(book.apply(event) for event in pending):
+                book.synced = True
+                logger.info(f"Order book for {book.symbol} synced at {book.last_update_id}")
+            else:
+                book.reset()
+
+    def book(self, symbol):
+        """The synced book for `symbol`, or None if it is not live."""
+        if self._stream is None or not self._stream.connected:
+            return None
+        book = self.books.get(symbol.upper())
+        return book if book is not None and book.synced else None
+
+    def stats(self):
+        return {
+            "books": {symbol: book.synced for symbol, book in self.books.items()},
+            "resyncs": self.resyncs,
+        }
+
+
+order_books = OrderBookManager()
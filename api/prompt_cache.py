@@ -0,0 +1,75 @@
+import os
+import threading
+
+# Mark the stable request prefix with cache_control breakpoints
+PROMPT_CACHING = os.environ.get("PROMPT_CACHING", "true").lower() in ("1", "true", "yes")
+# The API allows 4 breakpoints; tools and system use one each
+MESSAGE_BREAKPOINTS = 2
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def cache_system(system_prompt):
+    return [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL}]
+
+
+def cache_tools(tools):
+    """Tool definitions with a breakpoint after the last one (copies, input untouched)."""
+    if not tools:
+        return tools
+    return tools[:-1] + [{**tools[-1], "cache_control": EPHEMERAL}]
+
+
+def _marked(message):
+    content = message["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    last = content[-1]
+    if not isinstance(last, dict):
+        last = last.model_dump() if hasattr(last, "model_dump") else {"type": "text", "text": str(last)}
+    return {**message, "content": list(content[:-1]) + [{**last, "cache_control": EPHEMERAL}]}
+
+
+def cache_messages(messages):
+    """Mark the ends of the last MESSAGE_BREAKPOINTS user turns.
+
+    The newest breakpoint writes the whole history to the cache; the one
+    before it is where the previous call wrote, so that call's prefix is
+    read back even when the newest one is not cached yet.
+    """
+    marked = list(messages)
+    user_turns = [i for i, message in enumerate(messages) if message["role"] == "user" and message["content"]]
+    for i in user_turns[-MESSAGE_BREAKPOINTS:]:
+        marked[i] = _marked(messages[i])
+    return marked
+
+
+class LLMUsage:
+    """Token totals across LLM calls, including prompt cache reads and writes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+
+    def record(self, usage):
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += usage.input_tokens or 0
+            self.output_tokens += usage.output_tokens or 0
+            self.cache_read_tokens += getattr(usage, "cache_read_input_tokens", None) or 0
+            self.cache_write_tokens += getattr(usage, "cache_creation_input_tokens", None) or 0
+
+    def stats(self):
+        prompt = self.input_tokens + self.cache_read_tokens + self.cache_write_tokens
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            # Share of prompt tokens served from the cache
+            "cache_hit_ratio": round(self.cache_read_tokens / prompt, 4) if prompt else 0.0,
+        }
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import os
+import time
+
+from utils.logger import logger
+
+# Binance spot limits, see GET /api/v3/exchangeInfo "rateLimits"
+WEIGHT_LIMIT_1M = int(os.environ.get("BINANCE_WEIGHT_LIMIT_1M", "6000"))
+ORDER_LIMIT_10S = int(os.environ.get("BINANCE_ORDER_LIMIT_10S", "50"))
+ORDER_LIMIT_1D = int(os.environ.get("BINANCE_ORDER_LIMIT_1D", "160000"))
+# Fraction of each limit we allow ourselves to use, leaving room for clock skew
+# and other clients sharing the same IP
+SAFETY_MARGIN = float(os.environ.get("BINANCE_RATE_LIMIT_SAFETY", "0.9"))
+# MCP server processes sharing the IP (the client's session pool size); each
+# one only reserves its share of the limits
+RATE_LIMIT_PROCESSES = max(int(os.environ.get("BINANCE_RATE_LIMIT_PROCESSES", "1")), 1)
+
+# Endpoints that count towards the order limits (order/test does not)
+ORDER_ENDPOINTS = {"order"}
+
+
+def _symbol_count(params):
+    symbols = params.get("symbols")
+    if symbols is None:
+        return 0
+    if isinstance(symbols, str):
+        symbols = json.loads(symbols)
+    return len(symbols)
+
+
+def _depth_weight(params):
+    limit = int(params.get("limit") or 100)
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 25
+    if limit <= 1000:
+        return 50
+    return 250
+
+
+def _ticker_24hr_weight(params):
+    if params.get("symbol"):
+        return 2
+    count = _symbol_count(params)
+    if count == 0:
+        return 80
+    if count <= 20:
+        return 2
+    if count <= 100:
+        return 40
+    return 80
+
+
+def _per_symbol_weight(params):
+    if params.get("symbol"):
+        return 4
+    return min(4 * max(_symbol_count(params), 1), 200)
+
+
+def _book_or_price_ticker_weight(params):
+    return 2 if params.get("symbol") else 4
+
+
+ENDPOINT_WEIGHTS = {
+    "exchangeInfo": 20,
+    "klines": 2,
+    "aggTrades": 4,
+    "historicalTrades": 25,
+    "depth": _depth_weight,
+    "avgPrice": 2,
+    "ticker/24hr": _ticker_24hr_weight,
+    "ticker/tradingDay": _per_symbol_weight,
+    "ticker/price": _book_or_price_ticker_weight,
+    "ticker/bookTicker": _book_or_price_ticker_weight,
+    "ticker": _per_symbol_weight,
+    "account": 20,
+    "order": 1,
+    "order/test": 1,
+}
+
+
+def request_weight(endpoint, params=None):
+    """Return the request weight Binance charges for `endpoint` with `params`."""
+    weight = ENDPOINT_WEIGHTS.get(endpoint, 1)
+    if callable(weight):
+        weight = weight(params or {})
+    return weight
+
+
+class RateLimiter:
+    """Client-side governor for the Binance REST weight and order limits.
+
+    Every request reserves its weight before it is sent; callers that would
+    push the current minute over the limit wait for the next window. When
+    several processes share the IP, each one keeps its own reservations
+    under 1/`processes` of the limits. The IP-wide usage reported in the
+    X-MBX-USED-WEIGHT-1M and X-MBX-ORDER-COUNT-* headers is checked against
+    the full limits, and a 429/418 blocks all callers until the Retry-After
+    the exchange asked for.
+    """
+
+    def __init__(
+        self,
+        weight_limit=WEIGHT_LIMIT_1M,
+        order_limit_10s=ORDER_LIMIT_10S,
+        order_limit_1d=ORDER_LIMIT_1D,
+        safety_margin=SAFETY_MARGIN,
+        processes=RATE_LIMIT_PROCESSES,
+    ):
+        self.processes = processes
+        self.weight_limit = int(weight_limit * safety_margin)
+        self.order_limit_10s = int(order_limit_10s * safety_margin)
+        self.order_limit_1d = int(order_limit_1d * safety_margin)
+        # This process's reservations
+        self.used_weight = 0
+        self.order_count_10s = 0
+        self.order_count_1d = 0
+        # IP-wide usage: the exchange's last report plus reservations since
+        self.ip_used_weight = 0
+        self.ip_order_count_10s = 0
+        self.ip_order_count_1d = 0
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.bans = 0
+        self._windows = self._current_windows()
+        self._cond = asyncio.Condition()
+
+    @staticmethod
+    def _current_windows():
+        now = time.time()
+        return int(now // 60), int(now // 10), int(now // 86400)
+
+    def _roll_windows(self):
+        minute, ten_seconds, day = self._current_windows()
+        if minute != self._windows[0]:
+            self.used_weight = self.ip_used_weight = 0
+        if ten_seconds != self._windows[1]:
+            self.order_count_10s = self.ip_order_count_10s = 0
+        if day != self._windows[2]:
+            self.order_count_1d = self.ip_order_count_1d = 0
+        self._windows = (minute, ten_seconds, day)
+
+    def _delay(self, weight, is_order):
+        """Seconds to wait before a request of `weight` may be sent, 0 if none."""
+        now = time.time()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if (
+            self.used_weight + weight > self.weight_limit // self.processes
+            or self.ip_used_weight + weight > self.weight_limit
+        ):
+            return 60 - now % 60
+        if is_order:
+            if (
+                self.order_count_10s + 1 > self.order_limit_10s // self.processes
+                or self.ip_order_count_10s + 1 > self.order_limit_10s
+            ):
+                return 10 - now % 10
+            if (
+                self.order_count_1d + 1 > self.order_limit_1d // self.processes
+                or self.ip_order_count_1d + 1 > self.order_limit_1d
+            ):
+                return 86400 - now % 86400
+        return 0
+
+    async def acquire(self, endpoint, params=None):
+        """Wait until the request fits in the budget, then reserve its weight."""
+        weight = request_weight(endpoint, params)
+        is_order = endpoint in ORDER_ENDPOINTS
+        async with self._cond:
+            while True:
+                self._roll_windows()
+                delay = self._delay(weight, is_order)
+                if delay <= 0:
+                    break
+                self.throttled += 1
+                logger.warning(f"Rate limit reached, delaying {endpoint} for {delay:.1f}s")
+                try:
+                    await asyncio.wait_for(self._cond.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            self.used_weight += weight
+            self.ip_used_weight += weight
+            if is_order:
+                self.order_count_10s += 1
+                self.order_count_1d += 1
+                self.ip_order_count_10s += 1
+                self.ip_order_count_1d += 1
+            self.requests += 1
+        return weight
+
+    async def update(self, response):
+        """Correct the counters from the headers of a Binance response."""
+        headers = response.headers
+        async with self._cond:
+            self._roll_windows()
+            # Other requests may still be in flight, so never lower the estimate
+            if "x-mbx-used-weight-1m" in headers:
+                self.ip_used_weight = max(self.ip_used_weight, int(headers["x-mbx-used-weight-1m"]))
+            if "x-mbx-order-count-10s" in headers:
+                self.ip_order_count_10s = max(self.ip_order_count_10s, int(headers["x-mbx-order-count-10s"]))
+            if "x-mbx-order-count-1d" in headers:
+                self.ip_order_count_1d = max(self.ip_order_count_1d, int(headers["x-mbx-order-count-1d"]))
+            if response.status_code in (418, 429):
+                retry_after = int(headers.get("retry-after", "60"))
+                self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+                self.bans += 1
+                logger.error(
+                    f"Binance returned {response.status_code}, pausing requests for {retry_after}s"
+                )
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """Current budget and counters, for metrics."""
+        self._roll_windows()
+        weight_share = self.weight_limit // self.processes
+        return {
+            "processes": self.processes,
+            "weight_limit_1m": self.weight_limit,
+            "weight_share_1m": weight_share,
+            "used_weight_1m": self.used_weight,
+            "ip_used_weight_1m": self.ip_used_weight,
+            "remaining_weight_1m": max(
+                min(weight_share - self.used_weight, self.weight_limit - self.ip_used_weight), 0
+            ),
+            "order_limit_10s": self.order_limit_10s,
+            "order_count_10s": self.order_count_10s,
+            "ip_order_count_10s": self.ip_order_count_10s,
+            "order_limit_1d": self.order_limit_1d,
+            "order_count_1d": self.order_count_1d,
+            "ip_order_count_1d": self.ip_order_count_1d,
+            "blocked_for_seconds": max(self.blocked_until - time.time(), 0),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "bans": self.bans,
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,140 @@
+import re
+from datetime import datetime, timezone
+
+from klines import DAY, HOUR, INTERVAL_MS, MINUTE, page_windows
+
+# Binance weeks start on Monday 00:00 UTC; 1970-01-05 was the first Monday
+WEEK_OFFSET = 4 * DAY
+UNIT_MS = {"m": MINUTE, "h": HOUR, "d": DAY, "w": 7 * DAY}
+
+
+def interval_ms(interval):
+    """Length of a Binance interval, or of an interval Binance does not serve
+    such as "2d" or "45m", which can only be resampled."""
+    if interval in INTERVAL_MS:
+        return INTERVAL_MS[interval]
+    match = re.fullmatch(r"([1-9][0-9]*)([mhdw])", interval)
+    if not match:
+        raise ValueError(f"Unsupported interval: {interval}")
+    return int(match.group(1)) * UNIT_MS[match.group(2)]
+
+
+def _month_start(open_time, months_back=0):
+    dt = datetime.fromtimestamp(open_time / 1000, tz=timezone.utc)
+    month = dt.year * 12 + dt.month - 1 - months_back
+    start = datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000)
+
+
+def bucket_start(open_time, interval):
+    """Open time of the `interval` candle containing `open_time`."""
+    if interval == "1M":
+        return _month_start(open_time)
+    step = interval_ms(interval)
+    offset = WEEK_OFFSET if interval.endswith("w") else 0
+    return (open_time - offset) // step * step + offset
+
+
+def next_bucket_start(open_time, interval):
+    """Open time of the `interval` candle after the one containing `open_time`."""
+    if interval == "1M":
+        return _month_start(_month_start(open_time) + 32 * DAY)
+    return bucket_start(open_time, interval) + interval_ms(interval)
+
+
+def buckets_back(now, interval, count):
+    """Open time of the candle `count - 1` candles before the current one."""
+    if interval == "1M":
+        return _month_start(now, count - 1)
+    return bucket_start(now, interval) - (count - 1) * interval_ms(interval)
+
+
+def can_resample(base_interval, interval):
+    """Whether `interval` candles are made of whole `base_interval` candles."""
+    if base_interval == interval:
+        return True
+    base = interval_ms(base_interval)
+    if interval in ("1w", "1M"):
+        return base <= DAY and DAY % base == 0
+    return base_interval != "1M" and interval_ms(interval) % base == 0
+
+
+def resample(klines, base_interval, interval):
+    """Aggregate Binance klines of `base_interval` into `interval` klines.
+
+    Open is the first open, high/low the extremes, close the last close and
+    the volumes and trade counts are summed. A leading bucket that the base
+    candles only partly cover is dropped, so every returned candle except
+    the newest (still open) one is complete.
+    """
+    if base_interval == interval:
+        return list(klines)
+    if not can_resample(base_interval, interval):
+        raise ValueError(f"Cannot derive {interval} candles from {base_interval} candles")
+
+    buckets = []
+    current = None
+    for kline in klines:
+        start = bucket_start(kline[0], interval)
+        if current is None or current[0] != start:
+            current = [
+                start, kline[1], float(kline[2]), float(kline[3]), kline[4],
+                float(kline[5]), next_bucket_start(start, interval) - 1,
+                float(kline[7]), kline[8], float(kline[9]), float(kline[10]), "0",
+            ]
+            buckets.append(current)
+            continue
+        current[2] = max(current[2], float(kline[2]))
+        current[3] = min(current[3], float(kline[3]))
+        current[4] = kline[4]
+        current[5] += float(kline[5])
+        current[7] += float(kline[7])
+        current[8] += kline[8]
+        current[9] += float(kline[9])
+        current[10] += float(kline[10])
+
+    if buckets and klines[0][0] != buckets[0][0]:
+        buckets.pop(0)
+    for bucket in buckets:
+        for i in (2, 3, 5, 7, 9, 10):
+            bucket[i] = f"{bucket[i]:.8f}"
+    return buckets
+
+
+def common_base(intervals):
+    """The longest Binance interval all of `intervals` can be resampled from
+    (an interval Binance serves is its own base), or None."""
+    for interval in intervals:
+        interval_ms(interval)
+    bases = [base for base in INTERVAL_MS if all(can_resample(base, interval) for interval in intervals)]
+    return max(bases, key=interval_ms, default=None)
+
+
+def plan_bases(starts, now, max_pages):
+    """Pick the Binance interval to fetch for each timeframe in `starts`
+    ({timeframe: first open time needed}), sharing fetches where possible.
+
+    Timeframes sorted by length are split into runs fetched at their common
+    base, each run taking at most `max_pages` pages up to `now`; of all
+    splits, the one with the fewest fetches and then the fewest pages wins.
+    Returns {timeframe: base interval}.
+    """
+    ordered = sorted(starts, key=interval_ms)
+    # best[i]: (fetches, pages, bases) for the first i timeframes
+    best = [(0, 0, {})]
+    for end in range(1, len(ordered) + 1):
+        options = []
+        for begin in range(end):
+            run = ordered[begin:end]
+            base = common_base(run)
+            if base is None:
+                if len(run) == 1:
+                    raise ValueError(f"Cannot derive {run[0]} candles from any Binance interval")
+                continue
+            pages = len(page_windows(min(starts[timeframe] for timeframe in run), now, base))
+            if pages > max_pages and len(run) > 1:
+                continue
+            fetches, total, bases = best[begin]
+            options.append((fetches + 1, total + pages, {**bases, **dict.fromkeys(run, base)}))
+        best.append(min(options, key=lambda option: option[:2]))
+    return {timeframe: best[-1][2][timeframe] for timeframe in starts}
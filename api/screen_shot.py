@@ -1,10 +1,20 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+import asyncio
+import hashlib
 import os
+import shutil
+import tempfile
+import threading
+import time
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+from browser_pool import browser_pool, capture_in_tabs
+from chart_renderer import render_chart
+from image_pipeline import TRADINGVIEW_CHART_BOX, image_pipeline
+from klines import fetch_klines
+from utils.logger import logger
 
 
 # Cloudinary Configuration
@@ -20,17 +30,245 @@ cloudinary.config(
 )
 
 
+# TradingView interval for each captured timeframe
+TIMEFRAMES = {
+    'hourly': '1H',
+    'daily': '1D',
+    'weekly': '1W',
+    'monthly': '1M',
+}
+# Binance kline interval for each timeframe when rendering natively
+NATIVE_INTERVALS = {
+    'hourly': '1h',
+    'daily': '1d',
+    'weekly': '1w',
+    'monthly': '1M',
+}
+NATIVE_CANDLES = int(os.environ.get("NATIVE_CHART_CANDLES", "120"))
+CHART_RENDER_WORKERS = int(os.environ.get("CHART_RENDER_WORKERS", "4"))
+SCREENSHOT_MODE = os.environ.get("SCREENSHOT_MODE", "tradingview")
+# "cloudinary", or "local" to copy uploads into a directory (offline testing)
+SCREENSHOT_UPLOAD_BACKEND = os.environ.get("SCREENSHOT_UPLOAD_BACKEND", "cloudinary")
+SCREENSHOT_LOCAL_UPLOAD_DIR = os.environ.get(
+    "SCREENSHOT_LOCAL_UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'uploads')
+)
+# Simulated network time per local upload, in seconds
+SCREENSHOT_LOCAL_UPLOAD_LATENCY = float(os.environ.get("SCREENSHOT_LOCAL_UPLOAD_LATENCY", "0"))
+UPLOAD_WORKERS = int(os.environ.get("SCREENSHOT_UPLOAD_WORKERS", "4"))
+# Seconds an uploaded chart is served from cache; longer timeframes change slower
+SCREENSHOT_TTLS = {
+    'hourly': float(os.environ.get("SCREENSHOT_TTL_HOURLY", "60")),
+    'daily': float(os.environ.get("SCREENSHOT_TTL_DAILY", "300")),
+    'weekly': float(os.environ.get("SCREENSHOT_TTL_WEEKLY", "1800")),
+    'monthly': float(os.environ.get("SCREENSHOT_TTL_MONTHLY", "7200")),
+}
+
+screenshot_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ScreenShot')
+_render_pool = None
+_upload_pool = ThreadPoolExecutor(UPLOAD_WORKERS, thread_name_prefix="upload")
+
+
+def symbol_name_from_url(chart_url):
+    return chart_url.split('symbol=')[-1].split('&')[0].replace('%3A', '_')
+
+
+def binance_symbol_from_url(chart_url):
+    """Map a TradingView chart URL symbol (e.g. CRYPTO:BTCUSD) to a Binance pair."""
+    symbol = chart_url.split('symbol=')[-1].split('&')[0].replace('%3A', ':').split(':')[-1].upper()
+    # TradingView's CRYPTO USD indexes correspond to Binance's USDT pairs
+    return symbol + 'T' if symbol.endswith('USD') else symbol
+
+
+def _upload_local(screenshot_file, public_id):
+    time.sleep(SCREENSHOT_LOCAL_UPLOAD_LATENCY)
+    target = Path(SCREENSHOT_LOCAL_UPLOAD_DIR, public_id + Path(screenshot_file).suffix)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(screenshot_file, target)
+    return target.as_uri()
+
+
+def upload_screenshot(screenshot_file, symbol_name, name):
+    """Upload a chart image to Cloudinary and return its URL (None on failure)."""
+    if SCREENSHOT_UPLOAD_BACKEND == "local":
+        uploaded_url = _upload_local(screenshot_file, f"mcp_screenshots/{symbol_name}_{name}")
+        logger.info(f"Uploaded locally: {uploaded_url}")
+        return uploaded_url
+    try:
+        # Construct a unique public_id for Cloudinary
+        # This helps in organizing and managing images in your Cloudinary account
+        cloudinary_public_id = f"mcp_screenshots/{symbol_name}_{name}"
+
+        upload_response = cloudinary.uploader.upload(
+            screenshot_file,
+            public_id=cloudinary_public_id,
+            overwrite=True  # Overwrites if an image with the same public_id already exists
+        )
+        uploaded_url = upload_response.get('secure_url')
+        if uploaded_url:
+            logger.info(f"Uploaded to Cloudinary: {uploaded_url}")
+        else:
+            logger.warning("Uploaded to Cloudinary, but URL not available in response.")
+        return uploaded_url
+    except Exception as e:
+        logger.error(f"Cloudinary upload failed for {screenshot_file}: {e}")
+        return None
+
+
+def capture_path(symbol_name, name):
+    """A new file for one capture, so concurrent jobs for a symbol never share one."""
+    fd, path = tempfile.mkstemp(prefix=f'{symbol_name}_{name}_', suffix='.png', dir=screenshot_dir)
+    os.close(fd)
+    return path
+
+
+def remove_files(*paths):
+    for path in set(paths):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class ScreenshotCache:
+    """Uploaded chart URLs keyed by (source, symbol, timeframe).
+
+    A URL is served until its timeframe's TTL expires. Re-captured images
+    are SHA-256 hashed, and one identical to the last upload for its key
+    reuses that URL instead of being uploaded again.
+    """
+
+    def __init__(self, ttls=SCREENSHOT_TTLS):
+        self.ttls = ttls
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uploads = 0
+        self.uploads_skipped = 0
+
+    def get(self, source, symbol_name, name):
+        with self._lock:
+            entry = self._entries.get((source, symbol_name, name))
+            if entry and time.monotonic() - entry["stored_at"] < self.ttls.get(name, 0):
+                self.hits += 1
+                return entry["url"]
+            self.misses += 1
+            return None
+
+    def upload(self, source, symbol_name, name, screenshot_file):
+        """Upload `screenshot_file` unless it is identical to the cached image."""
+        key = (source, symbol_name, name)
+        digest = file_digest(screenshot_file)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["digest"] == digest:
+                entry["stored_at"] = time.monotonic()
+                self.uploads_skipped += 1
+                logger.info(f"Unchanged chart, reusing upload: {entry['url']}")
+                return entry["url"]
+        # Native renders get their own public ids so they never replace the TradingView captures
+        upload_name = name if source == 'tradingview' else f"{name}_{source}"
+        url = upload_screenshot(screenshot_file, symbol_name, upload_name)
+        if url:
+            with self._lock:
+                self._entries[key] = {"url": url, "digest": digest, "stored_at": time.monotonic()}
+                self.uploads += 1
+        return url
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "uploads": self.uploads,
+            "uploads_skipped": self.uploads_skipped,
+        }
+
+
+screenshot_cache = ScreenshotCache()
+
+
+def optimize_and_upload(source, symbol_name, name, screenshot_file):
+    """Shrink a captured chart with the image pipeline, then upload it through the cache.
+
+    The capture and the optimized file are deleted once uploaded.
+    """
+    crop_box = TRADINGVIEW_CHART_BOX if source == 'tradingview' else None
+    output = screenshot_file
+    try:
+        output, report = image_pipeline.process(screenshot_file, crop_box)
+        logger.info(
+            f"Optimized {name} chart ({report['profile']}): {report['bytes_in']} -> {report['bytes_out']} bytes "
+            f"({report['saved_pct']}% smaller) in {report['ms']}ms"
+        )
+        return screenshot_cache.upload(source, symbol_name, name, output)
+    finally:
+        remove_files(screenshot_file, output)
+
+
+def _get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=CHART_RENDER_WORKERS)
+    return _render_pool
+
+
+async def take_native_screenshot(chart_url, overlays=True):
+    """Render the chart timeframes from Binance klines instead of a browser.
+
+    Klines for every timeframe are fetched concurrently, the charts are drawn
+    in parallel in a process pool and uploaded like the TradingView captures.
+    """
+    started = time.perf_counter()
+    symbol_name = symbol_name_from_url(chart_url)
+    symbol = binance_symbol_from_url(chart_url)
+    source = 'native' if overlays else 'native-plain'
+    urls = {name: screenshot_cache.get(source, symbol_name, name) for name in NATIVE_INTERVALS}
+    stale = {name: interval for name, interval in NATIVE_INTERVALS.items() if not urls[name]}
+    if not stale:
+        return list(urls.values())
+    os.makedirs(screenshot_dir, exist_ok=True)
+
+    pages = await asyncio.gather(
+        *(fetch_klines(symbol, interval, limit=NATIVE_CANDLES) for interval in stale.values())
+    )
+    loop = asyncio.get_running_loop()
+    pool = _get_render_pool()
+
+    async def render_and_upload(name, interval, klines):
+        # Each chart uploads as soon as it is drawn, while the others still render
+        target = capture_path(symbol_name, name)
+        try:
+            screenshot_file = await loop.run_in_executor(
+                pool, render_chart, klines, target, f"{symbol} {interval}", overlays
+            )
+        except BaseException:
+            remove_files(target)
+            raise
+        return await loop.run_in_executor(
+            _upload_pool, optimize_and_upload, source, symbol_name, name, screenshot_file
+        )
+
+    uploaded = await asyncio.gather(*(
+        render_and_upload(name, interval, klines) for (name, interval), klines in zip(stale.items(), pages)
+    ))
+    logger.info(f"Rendered and uploaded {len(uploaded)} charts for {symbol} in {time.perf_counter() - started:.2f}s")
+    urls.update(zip(stale, uploaded))
+    return [url for url in urls.values() if url]
+
+
 def take_screenshot(chart_url):
-    cloudinary_urls = []  # Initialize list to store Cloudinary URLs
     # Extract symbol name from URL
-    symbol_name = chart_url.split('symbol=')[-1].split('&')[0].replace('%3A', '_')
+    symbol_name = symbol_name_from_url(chart_url)
     # Define different timeframes
-    timeframes = {
-        'hourly': '1H',
-        'daily': '1D',
-        'weekly': '1W',
-        'monthly': '1M',
-    }
+    timeframes = TIMEFRAMES
 
     # Function to take screenshots for different timeframes
     def capture_chart_timeframes(base_url, timeframes):
@@ -39,63 +277,48 @@ def take_screenshot(chart_url):
         for name, interval in timeframes.items():
             # Append timeframe parameter to URL
             timeframe_url = f"{base_url}&interval={interval}"
-            print(f"Capturing {name} chart from: {timeframe_url}")
+            logger.info(f"Capturing {name} chart from: {timeframe_url}")
             screenshots.append((name, timeframe_url))
         
         return screenshots
 
+    # Serve timeframes captured recently from the cache
+    cached = {name: screenshot_cache.get('tradingview', symbol_name, name) for name in timeframes}
+    timeframes = {name: interval for name, interval in timeframes.items() if not cached[name]}
+    if not timeframes:
+        logger.info("All screenshots served from cache")
+        return list(cached.values())
+
     # Prepare URLs for different timeframes
     chart_screenshots = capture_chart_timeframes(chart_url, timeframes)
 
-    # Set up Chrome options
-    options = Options()
-    # Run in headless mode (no visible browser window)
-    options.add_argument('--headless=new')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--window-size=1280,800')
+    # Ensure ScreenShot directory exists
+    os.makedirs(screenshot_dir, exist_ok=True)
+
+    # Load every timeframe in its own tab of a warm pooled browser and
+    # capture each as soon as its chart has rendered
+    started = time.perf_counter()
+    targets = [(url, capture_path(symbol_name, name)) for name, url in chart_screenshots]
+    uploads = {}
 
-    # Import time at the top level
-    import time
+    def upload_captured(index, screenshot_file):
+        # Upload in the background while the next timeframe is captured
+        name = chart_screenshots[index][0]
+        logger.info(f"Screenshot saved: {screenshot_file}")
+        uploads[name] = _upload_pool.submit(optimize_and_upload, 'tradingview', symbol_name, name, screenshot_file)
 
-    # Initialize the Chrome driver with options
-    driver = webdriver.Chrome(options=options)
+    try:
+        with browser_pool.lease() as driver:
+            capture_in_tabs(driver, targets, on_captured=upload_captured)
+    finally:
+        # Captures handed to an upload are deleted by it
+        remove_files(*(target for _, target in targets[len(uploads):]))
+    logger.info(f"Captured {len(targets)} charts in {time.perf_counter() - started:.2f}s")
 
-    # Ensure ScreenShot directory exists
-    screenshot_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ScreenShot')
-    os.makedirs(screenshot_dir, exist_ok=True)
+    for name, upload in uploads.items():
+        cached[name] = upload.result()
 
-    # Loop through each timeframe and take screenshots
-    for name, url in chart_screenshots:
-        print(f"Loading: {url}")
-        driver.get(url)
-        
-        # Wait for the chart to load (increase sleep if needed)
-        time.sleep(10)  # Increased to ensure chart loads completely
-        
-        # Take screenshot with symbol name and timeframe
-        screenshot_file = os.path.join(screenshot_dir, f'{symbol_name}_{name}.png')
-        driver.save_screenshot(screenshot_file)
-        print(f"Screenshot saved: {screenshot_file}")
-        try:
-                # Construct a unique public_id for Cloudinary
-                # This helps in organizing and managing images in your Cloudinary account
-                cloudinary_public_id = f"mcp_screenshots/{symbol_name}_{name}"
-                
-                upload_response = cloudinary.uploader.upload(
-                    screenshot_file,
-                    public_id=cloudinary_public_id,
-                    overwrite=True  # Overwrites if an image with the same public_id already exists
-                )
-                uploaded_url = upload_response.get('secure_url')
-                if uploaded_url:
-                    print(f"Uploaded to Cloudinary: {uploaded_url}")
-                    cloudinary_urls.append(uploaded_url)
-                else:
-                    print("Uploaded to Cloudinary, but URL not available in response.")
-        except Exception as e:
-            print(f"Cloudinary upload failed for {screenshot_file}: {e}")
-
-    # Close the browser when done
-    driver.quit()
-    print("All screenshots captured successfully!")
+    # Keep the timeframe order of the returned URLs
+    cloudinary_urls = [url for url in cached.values() if url]
+    logger.info("All screenshots captured successfully!")
     return cloudinary_urls
@@ -0,0 +1,51 @@
+import asyncio
+
+
+def make_key(method, endpoint, params=None):
+    """Normalize a request into a hashable key, independent of param order."""
+    normalized = tuple(
+        sorted((key, str(value)) for key, value in (params or {}).items() if value is not None)
+    )
+    return method.upper(), endpoint, normalized
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls into a single in-flight call.
+
+    The first caller for a key starts the call as a task; callers that arrive
+    with the same key while it is running await that task instead of starting
+    their own. The task is shielded so one caller being cancelled does not
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def do(self, key, fn):
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "in_flight": len(self._in_flight),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from klines import interval_ms, now_ms
+
+TOOL_CACHE_MAX_BYTES = int(os.environ.get("TOOL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+IMMUTABLE = float("inf")
+
+# Seconds a tool result stays valid; tools missing here are never cached
+TOOL_TTLS = {
+    "bb7_ExchangeInfoOfASymbole": 300,
+    "bb7_ExchangeInfoOfAllSymbole": 300,
+    "bb7_FindSymbols": 300,
+    "bb7_MultiTimeframe": 10,
+    "bb7_TechnicalIndicators": 10,
+    "bb7_AggTrades": 1,
+    "bb7_TradeHistory": 1,
+    "bb7_Depth": 1,
+    "bb7_CumulativeDepth": 1,
+    "bb7_CurrentAvgPrice": 3,
+    "bb7_PriceTickerIn24Hr": 3,
+    "bb7_TradingDayTicker": 3,
+    "bb7_SymbolPriceTicker": 3,
+    "bb7_SymbolOrderBookTicker": 3,
+    "bb7_RollingWindowTicker": 3,
+}
+# Klines are immutable once the candle containing endTime has closed
+KLINE_TOOLS = {"bb7_getTradeData", "bb7_getTradeDataRange"}
+OPEN_KLINES_TTL = 5
+
+
+def tool_ttl(name, args):
+    """TTL in seconds for a call's result; None when it must not be cached."""
+    if name in KLINE_TOOLS:
+        end_time = args.get("endTime")
+        try:
+            if end_time is not None and int(end_time) + interval_ms(args["interval"]) <= now_ms():
+                return IMMUTABLE
+        except (KeyError, TypeError, ValueError):
+            return None
+        return OPEN_KLINES_TTL
+    return TOOL_TTLS.get(name)
+
+
+def cache_key(name, args):
+    return name + json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _texts(result):
+    return [getattr(content, "text", None) or "" for content in result.content]
+
+
+def _is_error(result):
+    if getattr(result, "isError", False):
+        return True
+    # Tools report Binance and local failures as JSON text rather than MCP errors
+    return any(text.startswith(('{"error"', '{"code":-', 'Error')) for text in _texts(result))
+
+
+class ToolResultCache:
+    """LRU memo of MCP tool results keyed by tool name and canonical args.
+
+    Each entry expires after its tool's TTL (see `tool_ttl`); the total size
+    of cached result text is kept under `max_bytes` by evicting the least
+    recently used entries. Failed calls are never cached.
+    """
+
+    def __init__(self, max_bytes=TOOL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, name, args):
+        key = cache_key(name, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            result, expires_at, size = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, name, args, result):
+        ttl = tool_ttl(name, args)
+        size = sum(len(text) for text in _texts(result)) + 200
+        if not ttl or _is_error(result) or size > self.max_bytes // 4:
+            self.uncacheable += 1
+            return
+        key = cache_key(name, args)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, time.monotonic() + ttl, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "uncacheable": self.uncacheable,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
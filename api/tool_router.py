@@ -0,0 +1,170 @@
+"""Per-query selection of the MCP tools sent to the LLM.
+
+Tools are scored against the query with a small keyword index built from
+each tool's name, description and the extra words in TOOL_KEYWORDS,
+weighted by inverse document frequency so that words shared by every tool
+("symbol", "get") count for little. CORE_TOOLS are always sent. When no
+tool scores TOOL_ROUTER_FALLBACK_SCORE, the match is too weak to trust
+(typically one incidental word) and every tool is sent. The model can
+widen its subset by calling the `requestMoreTools` tool, and a call to a
+known tool outside the subset adds that tool.
+
+Routing is off by default. Tools are the first block of the cached prompt
+prefix, so every distinct subset (and every expansion) writes the tools
+and system prompt to the cache again; `eval_tool_router.py` reports the
+cost with that included.
+"""
+import math
+import os
+import re
+
+TOOL_ROUTING = os.environ.get("TOOL_ROUTING", "false").lower() in ("1", "true", "yes")
+# Routed tools sent besides CORE_TOOLS
+TOOL_ROUTER_MAX_TOOLS = int(os.environ.get("TOOL_ROUTER_MAX_TOOLS", "5"))
+TOOL_ROUTER_MIN_SCORE = float(os.environ.get("TOOL_ROUTER_MIN_SCORE", "1.5"))
+# Best score a query needs to be routed at all; one word unique to a single
+# tool scores about 3
+TOOL_ROUTER_FALLBACK_SCORE = float(os.environ.get("TOOL_ROUTER_FALLBACK_SCORE", "4.0"))
+
+# Tools the default trading analysis needs for any query
+CORE_TOOLS = ["bb7_getTradeData", "bb7_MultiTimeframe", "bb7_TechnicalIndicators", "bb7_SymbolPriceTicker"]
+# Query words that point at a tool beyond its name and description
+TOOL_KEYWORDS = {
+    "takeScreenShotOfTarde": "screenshot chart tradingview image picture snapshot analysis analyze "
+                             "entry target stop loss setup",
+    "bb7_PutOrder": "buy sell order place execute open position long short",
+    "bb7_ExchangeInfoOfAllSymbole": "all every exchange listed pairs markets",
+    "bb7_ExchangeInfoOfASymbole": "rules filters precision tick lot size notional minimum",
+    "bb7_FindSymbols": "find search pairs list quote base asset listed",
+    "bb7_Depth": "order book depth bids asks levels walls",
+    "bb7_CumulativeDepth": "liquidity depth spread imbalance walls bids asks",
+    "bb7_AggTrades": "recent trades flow whales aggregate",
+    "bb7_TradeHistory": "recent trades history fills tape",
+    "bb7_CurrentAvgPrice": "average price",
+    "bb7_PriceTickerIn24Hr": "24h 24hr daily change volume high low performance",
+    "bb7_TradingDayTicker": "today trading day change volume",
+    "bb7_SymbolOrderBookTicker": "best bid ask spread",
+    "bb7_RollingWindowTicker": "rolling window week change performance volume",
+    "bb7_getTradeDataRange": "history historical range period since months year backtest",
+    "bb7_MultiTimeframe": "multi timeframe timeframes weekly monthly",
+    "bb7_TechnicalIndicators": "indicators rsi macd ema sma bollinger atr vwap support resistance pivots trend",
+}
+
+REQUEST_TOOLS_NAME = "requestMoreTools"
+REQUEST_TOOLS_TOOL = {
+    "name": REQUEST_TOOLS_NAME,
+    "description": "Only some tools are available for this query. Call this when none of them can do what "
+                   "is needed; describe the missing capability and matching tools are added for your next step.",
+    "input_schema": {
+        "type": "object",
+        "properties": {"need": {"type": "string", "description": "What the missing tool should do"}},
+        "required": ["need"],
+    },
+}
+
+STOPWORDS = {
+    "the", "and", "for", "get", "with", "that", "this", "from", "are", "its", "per", "all", "you", "can",
+    "optional", "returns", "args", "specified", "e.g", "of", "to", "a", "an", "in", "on", "or", "is", "me",
+}
+
+
+def tokenize(text):
+    """Lowercase word stems of text, with camelCase and snake_case names split."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words
+            if len(word) > 1 and word not in STOPWORDS}
+
+
+class ToolRouter:
+    def __init__(
+        self,
+        tools,
+        max_tools=TOOL_ROUTER_MAX_TOOLS,
+        min_score=TOOL_ROUTER_MIN_SCORE,
+        fallback_score=TOOL_ROUTER_FALLBACK_SCORE,
+    ):
+        self.tools = tools
+        self.names = [tool["name"] for tool in tools]
+        self.max_tools = max_tools
+        self.min_score = min_score
+        self.fallback_score = fallback_score
+        self.terms = {
+            tool["name"]: tokenize(tool["name"]) | tokenize(tool.get("description"))
+            | tokenize(TOOL_KEYWORDS.get(tool["name"]))
+            for tool in tools
+        }
+        count = len(tools) or 1
+        self.idf = {}
+        for terms in self.terms.values():
+            for term in terms:
+                self.idf[term] = self.idf.get(term, 0) + 1
+        self.idf = {term: math.log(1 + count / df) for term, df in self.idf.items()}
+        self.routed = 0
+        self.fallbacks = 0
+        self.expansions = 0
+
+    def scores(self, text):
+        query = tokenize(text)
+        scores = {name: sum(self.idf[term] for term in query & terms) for name, terms in self.terms.items()}
+        for name in self.names:
+            # Naming a tool outright always selects it
+            if name in (text or ""):
+                scores[name] += 100
+        return scores
+
+    def matches(self, text, scores=None):
+        scores = scores or self.scores(text)
+        ranked = sorted((name for name in self.names if scores[name] >= self.min_score), key=scores.get, reverse=True)
+        return ranked[:self.max_tools]
+
+    def select(self, query, messages=()):
+        """Tool names for a conversation: core tools, matches for the query and tools it already used.
+
+        Every tool is selected when the query matches none of them confidently.
+        """
+        self.routed += 1
+        scores = self.scores(query)
+        if max(scores.values(), default=0) < self.fallback_score:
+            self.fallbacks += 1
+            return set(self.names)
+        selected = {name for name in CORE_TOOLS if name in self.terms}
+        selected.update(self.matches(query, scores))
+        for message in messages:
+            if message["role"] == "assistant" and isinstance(message["content"], list):
+                selected.update(
+                    block["name"] for block in message["content"]
+                    if isinstance(block, dict) and block.get("type") == "tool_use" and block.get("name") in self.terms
+                )
+        return selected
+
+    def expand(self, selected, need):
+        """Add the tools matching `need` (all tools when none match); returns the names added."""
+        matches = [name for name in self.matches(need) if name not in selected] or \
+            [name for name in self.names if name not in selected]
+        selected.update(matches)
+        self.expansions += 1
+        return matches
+
+    def add(self, selected, name):
+        """Add a known tool the model called although it was not offered."""
+        if name in self.terms and name not in selected:
+            selected.add(name)
+            self.expansions += 1
+            return True
+        return False
+
+    def tools_for(self, selected):
+        """Tool definitions to send, in their original order so the prefix stays cacheable."""
+        tools = [tool for tool in self.tools if tool["name"] in selected]
+        if len(tools) < len(self.tools):
+            tools.append(REQUEST_TOOLS_TOOL)
+        return tools
+
+    def stats(self):
+        return {
+            "tools": len(self.tools),
+            "routed_queries": self.routed,
+            "fallbacks": self.fallbacks,
+            "expansions": self.expansions,
+        }
@@ -13,8 +13,9 @@ file_handler.setFormatter(
 )
 logger.addHandler(file_handler)
 
-# Console handler with INFO level
-console_handler = logging.StreamHandler(sys.stdout)
+# Console handler with INFO level, on stderr because stdout is the MCP
+# server's stdio protocol channel
+console_handler = logging.StreamHandler(sys.stderr)
 console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(
     logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
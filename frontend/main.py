@@ -2,6 +2,7 @@ import streamlit as st
 import requests
 import os
 import json
+from datetime import datetime
 
 # Path to conversations directory
 conv_dir = os.path.join(
@@ -13,6 +14,8 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "loaded_conversation_file" not in st.session_state:
     st.session_state.loaded_conversation_file = None
+if "conversation_id" not in st.session_state:
+    st.session_state.conversation_id = None
 
 
 # Function to render chat messages
@@ -140,29 +143,51 @@ def render_chat(messages):
 selected_option = "New Chat"  # Initialize with a default value
 
 
+def load_journal():
+    """Rebuild conversations from the API's JSON Lines journal.
+
+    Returns {option label: (conversation id, messages)}, newest first. Each
+    journal line holds one message: {"c": id, "i": index, "t": time, "m": message}.
+    """
+    conversations = {}
+    # Closed journal-*.jsonl segments sort before the active journal.jsonl
+    for name in sorted(os.listdir(conv_dir)):
+        if not (name.startswith("journal") and name.endswith(".jsonl")):
+            continue
+        with open(os.path.join(conv_dir, name), "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                conv = conversations.setdefault(record["c"], {"started": record["t"], "messages": {}})
+                conv["messages"][record["i"]] = record["m"]
+
+    options = {}
+    for conv_id, conv in sorted(conversations.items(), key=lambda item: item[1]["started"], reverse=True):
+        messages = [conv["messages"][i] for i in sorted(conv["messages"])]
+        first = messages[0]["content"] if messages and isinstance(messages[0]["content"], str) else ""
+        started = datetime.fromtimestamp(conv["started"]).strftime("%Y-%m-%d %H:%M")
+        options[f"{started} · {first[:40]} ({conv_id[:6]})"] = (conv_id, messages)
+    return options
+
+
 def load_conversation_from_file(conv_file_name):
-    conv_path = os.path.join(conv_dir, conv_file_name)
     try:
-        with open(conv_path, "r") as f:
-            conv_data = json.load(f)
-        st.session_state.messages = conv_data.get("messages", [])
+        conv_id, messages = journal[conv_file_name]
+        st.session_state.messages = messages
+        st.session_state.conversation_id = conv_id
         st.session_state.loaded_conversation_file = conv_file_name
     except Exception as e:
         st.sidebar.error(f"Failed to load conversation: {e}")
         st.session_state.messages = []
+        st.session_state.conversation_id = None
         st.session_state.loaded_conversation_file = None
 
 
 if os.path.exists(conv_dir):
-    conv_files = sorted(
-        [
-            f
-            for f in os.listdir(conv_dir)
-            if f.startswith("conversation_") and f.endswith(".json")
-        ],
-        reverse=True,
-    )
-    options = ["New Chat"] + conv_files
+    journal = load_journal()
+    options = ["New Chat"] + list(journal)
 
     current_selection_index = 0  # Default to "New Chat"
     if (
@@ -186,6 +211,7 @@ if os.path.exists(conv_dir):
             st.session_state.loaded_conversation_file is not None
         ):  # If a file was previously loaded
             st.session_state.messages = []
+            st.session_state.conversation_id = None
             st.session_state.loaded_conversation_file = None
             st.rerun()
     elif (
@@ -211,10 +237,8 @@ if prompt := st.chat_input("Type your message and press Enter..."):
     user_message = {"role": "user", "content": prompt}
     st.session_state.messages.append(user_message)
 
-    # If a historical chat was loaded, interacting means it's now a new/modified chat
-    if st.session_state.loaded_conversation_file is not None:
-        st.session_state.loaded_conversation_file = None
-        # This will cause the selectbox to default to "New Chat" on the next full rerun if not handled by index logic
+    # A loaded chat is continued under its conversation id, so the API
+    # rebuilds its history from the journal
 
     # Display the user's message immediately (Streamlit reruns on chat_input, so render_chat above will show it)
     # For an even more immediate feel without waiting for the full rerun logic for the new user message:
@@ -224,10 +248,12 @@ if prompt := st.chat_input("Type your message and press Enter..."):
     with st.spinner("Getting response..."):
         try:
             response = requests.post(
-                "http://localhost:8000/query", json={"query": prompt}
+                "http://localhost:8000/query",
+                json={"query": prompt, "conversation_id": st.session_state.conversation_id},
             )
             response.raise_for_status()
             data = response.json()
+            st.session_state.conversation_id = data.get("conversation_id")
 
             api_response_messages = data.get("messages", [])
             final_assistant_message_object = None